@@ -1,54 +1,58 @@
-# prmp_miscs
-import re, os, io
+# the parse process pool re-imports this script in every worker on Windows, so nothing (not even the freezer's import list) runs outside the guard.
+if __name__ == '__main__':
+    import multiprocessing
+    multiprocessing.freeze_support()
 
-# prmp_datetime.py
-import datetime, calendar
+    # prmp_miscs
+    import re, os, io
 
-# prmp_exts.py
-import base64, zlib, pickle, zipfile
+    # prmp_datetime.py
+    import datetime, calendar
 
-# prmp_images.py
-import sqlite3, base64, os, tkinter as tk
+    # prmp_exts.py
+    import base64, zlib, pickle, zipfile
 
-try:
-    from PIL.ImageTk import Image, PhotoImage, BitmapImage
-    from PIL import Image, ImageDraw, ImageSequence
-    from PIL import ImageGrab
-    _PIL_ = True
-except Exception as e:
-    _PIL_ = False
-    print('PIL <pillow> image library is not installed.')
+    # prmp_images.py
+    import sqlite3, base64, os, tkinter as tk
 
+    try:
+        from PIL.ImageTk import Image, PhotoImage, BitmapImage
+        from PIL import Image, ImageDraw, ImageSequence
+        from PIL import ImageGrab
+        _PIL_ = True
+    except Exception as e:
+        _PIL_ = False
+        print('PIL <pillow> image library is not installed.')
 
-# prmp_gui
-import platform
-from prmp_miscs import *
-from prmp_miscs import _PIL_, _CV2_
-import functools
 
-# core.py
-import os, time, random, tkinter as tk, sys, tkinter.ttk as ttk
-from tkinter.font import Font, families
+    # prmp_gui
+    import platform
+    from prmp_miscs import *
+    from prmp_miscs import _PIL_, _CV2_
+    import functools
 
-# windows.py
-import ctypes, subprocess, functools, os
+    # core.py
+    import os, time, random, tkinter as tk, sys, tkinter.ttk as ttk
+    from tkinter.font import Font, families
 
-# image_widgets.py
-import time
+    # windows.py
+    import ctypes, subprocess, functools, os
 
-# plot_canvas.py
-import random, math
+    # image_widgets.py
+    import time
 
-# dialogs.py
-import tkinter.messagebox as messagebox
-import tkinter.filedialog as filedialog
-import tkinter.simpledialog as simpledialog
+    # plot_canvas.py
+    import random, math
 
-import os, subprocess, shlex, threading, time, io, itertools
-from adb_images import ADB_IMAGES
+    # dialogs.py
+    import tkinter.messagebox as messagebox
+    import tkinter.filedialog as filedialog
+    import tkinter.simpledialog as simpledialog
 
-exit = os.sys.exit
+    import os, subprocess, shlex, threading, time, io, itertools
+    from adb_images import ADB_IMAGES
 
-from prmp_adb import *
-load()
-Android_FileSystem()
\ No newline at end of file
+    exit = os.sys.exit
+
+    from prmp_adb import main
+    main()
\ No newline at end of file
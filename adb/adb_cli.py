@@ -0,0 +1,199 @@
+
+import os, sys, json, time, itertools, argparse, subprocess
+
+started = time.perf_counter()
+
+from adb_core import *
+from adb_server import ADB_Client, DEFAULT_HOST, DEFAULT_PORT, device_info, entry_info, report_info, find_device, find_root, find_folder, scan_device, apk_sets
+
+
+class Local:
+    # same calls as ADB_Client, answered from this process's own Devices cache.
+
+    def __init__(self): load()
+
+    def save(self): save()
+
+    def devices(self, connected=False): return [device_info(device) for device in (Devices.create_devices(1) or [] if connected else Devices.list())]
+
+    def scan(self, device=None):
+        info = device_info(scan_device(device))
+        self.save()
+        return info
+
+    def scan_all(self):
+        for device in Devices.create_devices(1) or []:
+            yield self.scan(device.unique)
+
+    def ls(self, device=None, path='', order='', reverse=False, page=0, size=0):
+        view = find_folder(device, path).view(order, reverse)
+        return (entry_info(obj) for obj in (view.page(page, size) if size else view))
+
+    def search(self, q, device=None, case=False, match=False):
+        folders, files = find_root(device).search(q, case, match)
+        return (entry_info(obj) for obj in itertools.chain(folders, files))
+
+    def stats(self, device=None): return find_root(device).storage_stats.summary()
+
+    def du(self, device=None, path=''):
+        folder = find_folder(device, path)
+        stats = find_root(device).storage_stats
+        return (dict(path=obj.path, file=bool(obj.file), size=obj.full_size if obj.file else stats.folder_size(obj)) for obj in folder)
+
+    def diff(self, device=None):
+        device = find_device(device)
+        snapshots = device.get('snapshots') or []
+        if len(snapshots) < 2: raise ADB_Error(f'{device.unique} needs two snapshots to diff.')
+        return (dict(change=change, path=path, old_size=old, new_size=new, file=bool(kind)) for change, path, old, new, kind in Snapshot_Diff(snapshots[-2], snapshots[-1]))
+
+    def pull(self, paths, dest, device=None):
+        root = find_root(device)
+        with Command_Context(root.serial): return report_info(Bulk_Pull([root.all_files.get(path.lower()) or root.find_folder(path) or path for path in paths], dest).exec(quiet=1))
+
+    def push(self, src, dest, device=None):
+        with Command_Context(device): return report_info(Bulk_Push(src, dest).exec(quiet=1))
+
+    def packages(self, device=None, refresh=False):
+        inventory = Device_Packages.inventory(device or find_device().unique)
+        if refresh or not inventory.refreshed:
+            inventory.refresh()
+            self.save()
+        return (package.info() for package in inventory)
+
+    def install(self, apks, devices=None, replace=True, downgrade=False, grant=False, workers=8):
+        yield from (result.info() for result in Fleet(devices, workers).install(apks, replace, downgrade, grant))
+        self.save()
+
+    def uninstall(self, packages, devices=None, keep_data=False, workers=8):
+        yield from (result.info() for result in Fleet(devices, workers).uninstall(packages, keep_data))
+        self.save()
+
+
+# each timed in a fresh interpreter, from the imports to a loaded db; check_assets() is left out of the GUI's as it writes files.
+STARTUPS = dict(
+    cli='import adb_cli; adb_cli.Local()',
+    gui='import prmp_adb; prmp_adb.load()',
+)
+
+
+def startup_time(code):
+    code = f'import sys, time; sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r}); start = time.perf_counter(); {code}; print(time.perf_counter() - start)'
+    process = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    if process.returncode: return process.stderr.strip().splitlines()[-1] if process.stderr.strip() else f'exited with {process.returncode}'
+    return f'{float(process.stdout.split()[-1]):.03f}s'
+
+
+def emit(obj):
+    # one JSON object per line, flushed so `| jq` sees it as soon as it exists.
+    sys.stdout.write(json.dumps(obj) + '\n')
+    sys.stdout.flush()
+
+
+def run(args, backend):
+    command = args.command
+
+    if command == 'devices': return backend.devices(args.connected)
+    elif command == 'scan':
+        if args.device or not isinstance(backend, Local): return [backend.scan(args.device)]
+        return backend.scan_all()
+    elif command == 'ls': return backend.ls(args.device, args.path, args.order, args.reverse, args.page, args.size)
+    elif command == 'find': return backend.search(args.name, args.device, args.case, args.match)
+    elif command == 'du':
+        if args.summary: return [backend.stats(args.device)]
+        return backend.du(args.device, args.path)
+    elif command == 'diff': return backend.diff(args.device)
+    elif command == 'pull': return [backend.pull(args.paths, args.dest, args.device)]
+    elif command == 'push': return [backend.push(args.src, args.dest, args.device)]
+    elif command == 'packages': return backend.packages(args.device, args.refresh)
+    elif command == 'install': return backend.install(apk_sets(args.apks), args.device, not args.no_replace, args.downgrade, args.grant, args.workers)
+    elif command == 'uninstall': return backend.uninstall(args.packages, args.device, args.keep, args.workers)
+
+
+def parser():
+    parser = argparse.ArgumentParser(prog='adb_cli', description='Headless PRMP ADB: results are written as NDJSON, one object per line.')
+    parser.add_argument('--local', action='store_true', help='never attach to a running adb_server')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--timings', action='store_true', help='print start-up and run times to stderr, and the start-up of the CLI against the GUI')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    devices = commands.add_parser('devices', help='known devices, or the connected ones with -c')
+    devices.add_argument('-c', '--connected', action='store_true')
+
+    scan = commands.add_parser('scan', help='scan (or rescan) connected devices and save them')
+    scan.add_argument('-d', '--device')
+
+    ls = commands.add_parser('ls', help='list a scanned folder')
+    ls.add_argument('path', nargs='?', default='')
+    ls.add_argument('-d', '--device')
+    ls.add_argument('-o', '--order', default='', choices=['', *Children_View.orders])
+    ls.add_argument('-r', '--reverse', action='store_true')
+    ls.add_argument('--page', type=int, default=0)
+    ls.add_argument('--size', type=int, default=0)
+
+    find = commands.add_parser('find', help='search the scanned tree by name')
+    find.add_argument('name')
+    find.add_argument('-d', '--device')
+    find.add_argument('-c', '--case', action='store_true')
+    find.add_argument('-m', '--match', action='store_true')
+
+    du = commands.add_parser('du', help='sizes of the children of a scanned folder')
+    du.add_argument('path', nargs='?', default='')
+    du.add_argument('-d', '--device')
+    du.add_argument('-s', '--summary', action='store_true', help='storage summary of the whole device instead')
+
+    diff = commands.add_parser('diff', help='changes between the last two scans')
+    diff.add_argument('-d', '--device')
+
+    pull = commands.add_parser('pull', help='pull device paths into dest')
+    pull.add_argument('paths', nargs='+')
+    pull.add_argument('dest')
+    pull.add_argument('-d', '--device')
+
+    push = commands.add_parser('push', help='push a local file or folder to a device path')
+    push.add_argument('src')
+    push.add_argument('dest')
+    push.add_argument('-d', '--device')
+
+    packages = commands.add_parser('packages', help='cached package inventory of a device')
+    packages.add_argument('-d', '--device')
+    packages.add_argument('-r', '--refresh', action='store_true', help='refresh what changed on the device first')
+
+    install = commands.add_parser('install', help='install APKs on every connected device, or the -d ones, in parallel')
+    install.add_argument('apks', nargs='+', help='an APK, or split APKs joined with commas for install-multiple')
+    install.add_argument('-d', '--device', action='append')
+    install.add_argument('-w', '--workers', type=int, default=8, help='devices installing at once')
+    install.add_argument('--no-replace', action='store_true')
+    install.add_argument('--downgrade', action='store_true')
+    install.add_argument('-g', '--grant', action='store_true', help='grant all runtime permissions')
+
+    uninstall = commands.add_parser('uninstall', help='uninstall packages from every connected device, or the -d ones, in parallel')
+    uninstall.add_argument('packages', nargs='+')
+    uninstall.add_argument('-d', '--device', action='append')
+    uninstall.add_argument('-w', '--workers', type=int, default=8)
+    uninstall.add_argument('-k', '--keep', action='store_true', help='keep the data and cache directories')
+
+    return parser
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+
+    client = None if args.local else ADB_Client(args.host, args.port)
+    backend = client if client and client.running() else Local()
+    ready = time.perf_counter()
+
+    try:
+        result = run(args, backend)
+        for obj in [result] if isinstance(result, dict) else result: emit(obj)
+    except ADB_Error as error:
+        print(error, file=sys.stderr)
+        return 1
+    except BrokenPipeError: return 0
+
+    if args.timings:
+        print(f'{type(backend).__name__}: start-up {ready - started:.03f}s, {args.command} {time.perf_counter() - ready:.03f}s', file=sys.stderr)
+        print('fresh start-up: ' + ', '.join(f'{name} {startup_time(code)}' for name, code in STARTUPS.items()), file=sys.stderr)
+
+
+if __name__ == '__main__': sys.exit(main())
@@ -0,0 +1,2980 @@
+
+import os, re, sys, pickle, zlib, subprocess, shlex, threading, time, io, itertools, heapq, json, csv, hashlib, tarfile, posixpath, base64, struct, mmap, queue, collections, concurrent.futures
+
+try:
+    from PIL import Image as PIL_Image
+    _PIL_ = True
+except ImportError: _PIL_ = False
+
+try:
+    import av
+    _AV_ = True
+except ImportError: _AV_ = False
+
+
+DEFAULT_PATH = '/storage/emulated'
+DEFAULT_DB = 'android_datas.db'
+MAPPED_EXT = '.tree'
+DEFAULT_THUMBNAILS = 'thumbnails'
+
+image_size = (24, 24)
+
+ADB_EXE = r'adb.exe' if os.name == 'nt' else 'adb'
+
+class ADB_Error(Exception): ...
+
+
+INTERACTIVE, NORMAL, BULK = range(3)
+PRIORITIES = ['interactive', 'normal', 'bulk']
+
+
+class Command_Context:
+    # `with Command_Context(serial=..., priority=BULK):` sets, for this thread, which device the adb commands inside go to and which class they queue in.
+    local = threading.local()
+
+    def __init__(self, serial=None, priority=None):
+        self.serial = serial
+        self.priority = priority
+
+    @classmethod
+    def current(cls): return getattr(cls.local, 'serial', None), getattr(cls.local, 'priority', NORMAL)
+
+    def __enter__(self):
+        self.previous = self.current()
+        if self.serial is not None: self.local.serial = self.serial
+        if self.priority is not None: self.local.priority = self.priority
+        return self
+
+    def __exit__(self, *exc): self.local.serial, self.local.priority = self.previous
+
+
+class Command_Slot:
+    def __init__(self, scheduler, serial, priority):
+        self.scheduler = scheduler
+        self.serial = serial
+        self.priority = priority
+        self.ticket = None
+
+    def __enter__(self):
+        self.ticket = self.scheduler.acquire(self.serial, self.priority)
+        return self
+
+    def __exit__(self, *exc): self.scheduler.release(self.ticket)
+
+
+class Command_Scheduler:
+    # every run-to-completion adb command waits here for a slot. Bulk and normal work can never fill a device (or the host) completely, so an interactive command always finds one free; waiters go by class, then round-robin over devices.
+    device_slots = 4
+    host_slots = 8
+    class_slots = [4, 3, 2]
+    reserve = [0, 1, 2]
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.waiting = {}
+        self.running = {}
+        self.total = 0
+        self.served = {}
+        self.turn = itertools.count()
+        self.held = threading.local()
+        self.times = [dict(count=0, wait=0., max_wait=0., run=0.) for _ in PRIORITIES]
+
+    def slot(self, serial=None, priority=None):
+        context_serial, context_priority = Command_Context.current()
+        return Command_Slot(self, serial if serial is not None else context_serial, priority if priority is not None else context_priority)
+
+    def can_run(self, serial, priority):
+        running = self.running.get(serial) or [0, 0, 0]
+        if running[priority] >= self.class_slots[priority]: return False
+        if sum(running) >= self.device_slots - self.reserve[priority]: return False
+        return self.total < self.host_slots - self.reserve[priority]
+
+    def next_ticket(self):
+        for priority in range(len(PRIORITIES)):
+            serials = [serial for serial, queues in self.waiting.items() if queues[priority] and self.can_run(serial, priority)]
+            if serials: return self.waiting[min(serials, key=lambda serial: self.served.get(serial, -1))][priority][0]
+
+    def acquire(self, serial, priority):
+        # a thread already holding a slot (a bulk transfer running its own small commands) doesn't queue again.
+        if getattr(self.held, 'ticket', None): return
+
+        ticket = [serial, priority, time.time()]
+        with self.condition:
+            queues = self.waiting.setdefault(serial, [collections.deque() for _ in PRIORITIES])
+            queues[priority].append(ticket)
+            self.condition.notify_all()
+
+            while self.next_ticket() is not ticket: self.condition.wait()
+
+            queues[priority].popleft()
+            self.running.setdefault(serial, [0, 0, 0])[priority] += 1
+            self.total += 1
+            self.served[serial] = next(self.turn)
+            self.condition.notify_all()
+
+            waited = time.time() - ticket[2]
+            times = self.times[priority]
+            times['count'] += 1
+            times['wait'] += waited
+            times['max_wait'] = max(times['max_wait'], waited)
+
+        ticket[2] = time.time()
+        self.held.ticket = ticket
+        return ticket
+
+    def release(self, ticket):
+        if not ticket: return
+        self.held.ticket = None
+
+        with self.condition:
+            serial, priority, started = ticket
+            self.running[serial][priority] -= 1
+            self.total -= 1
+            self.times[priority]['run'] += time.time() - started
+            self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            stats = {}
+            for name, times, priority in zip(PRIORITIES, self.times, range(len(PRIORITIES))):
+                count = times['count'] or 1
+                stats[name] = dict(count=times['count'], avg_wait=times['wait'] / count, max_wait=times['max_wait'], avg_run=times['run'] / count, waiting=sum(len(queues[priority]) for queues in self.waiting.values()), running=sum(running[priority] for running in self.running.values()))
+            return stats
+
+
+class Process:
+    last_error = ''
+    
+    def __init__(self, process, quiet=False):
+        self.data = self.stdout = process.stdout.read()
+        self.error = self.stderr = process.stderr.read()
+
+        self.data_error = self.data, self.error
+
+        if self.stderr and not self.stdout and not quiet:
+            Process.last_error = self.stderr
+            raise ADB_Error(self.stderr)
+
+
+class Command:
+
+    @classmethod
+    def _exec(cls, args='', **kwargs):
+        if args:
+            if isinstance(args, str): args = shlex.split(args)
+            # print(args)
+        
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=False, **kwargs)
+        Task.started(process)
+        return process
+
+    @classmethod
+    def exec(cls, args='', quiet=False,  **kwargs): return Process(cls._exec(args, **kwargs), quiet)
+
+
+class ADB:
+    sub_command = ''
+    joined = False
+    scheduler = Command_Scheduler()
+
+    @classmethod
+    def _exec(cls, args='', **kwargs):
+        if args:
+            if cls.joined: args = [args if isinstance(args, str) else ' '.join(args)]
+            elif isinstance(args, str): args = shlex.split(args)
+            if cls.sub_command: args = [cls.sub_command, *args]
+        else: args = []
+
+        serial, _ = Command_Context.current()
+        args = [ADB_EXE, '-s', serial, *args] if serial else [ADB_EXE, *args]
+
+        cls.process =  process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=False, **kwargs)
+        Task.started(process)
+        return process
+
+
+    @classmethod
+    def exec(cls, args='', quiet=False, **kwargs):
+        with ADB.scheduler.slot(): return Process(cls._exec(args, **kwargs), quiet)
+
+
+class File_Transfer(ADB):
+
+    def __init__(self, src, dest):
+        self.src = str(src)
+        self.dest = str(dest)
+        super().__init__()
+    
+    def exec(self, **kwargs): return super().exec([self.src, self.dest], **kwargs)
+
+
+class Pull(File_Transfer): sub_command = 'pull'
+
+
+class Push(File_Transfer): sub_command = 'push'
+
+
+class Shell(ADB): sub_command = 'shell'
+
+
+class ExecIn(ADB):
+    # adb shell-escapes every exec-in/exec-out argument after the first, so the whole device command goes as that first one, joined like 'adb shell' joins its arguments.
+    sub_command = 'exec-in'
+    joined = True
+
+
+class ExecOut(ADB):
+    # 'adb exec-out' never allocates a pty, so the bytes arrive untranslated; transport() falls back to Shell on devices without it.
+    sub_command = 'exec-out'
+    joined = True
+    supported = {}
+    probe = b'prmp_adb'
+
+    @classmethod
+    def is_supported(cls):
+        serial, _ = Command_Context.current()
+        supported = cls.supported.get(serial)
+        if supported is not None: return supported
+
+        try:
+            supported = cls.exec(['echo', cls.probe.decode()], 1).data == cls.probe + b'\n'
+            # a failed probe only says something about the device when the device answers a plain shell; no device yet or adb starting up is asked again next time.
+            if supported or Shell.exec(['echo', cls.probe.decode()], 1).data.strip() == cls.probe: cls.supported[serial] = supported
+        except OSError: supported = False
+        return supported
+
+    @classmethod
+    def transport(cls): return cls if cls.is_supported() else Shell
+
+    @classmethod
+    def equivalent(cls, args='ls /sdcard -pRhs'):
+        exec_out = cls.exec(args, 1).data
+        shell = Shell.exec(args, 1).data
+        return exec_out == shell, exec_out, shell
+
+
+class Transfer_Report:
+    # quacks like Process (data, error, data_error) so the GUI can show bulk transfers like a plain Pull/Push.
+
+    def __init__(self, mode, files=0, size=0, elapsed=0, data=b'', error=b''):
+        self.mode = mode
+        self.files = files
+        self.size = size
+        self.elapsed = elapsed
+        self.error = self.stderr = error
+
+        summary = f'{mode}: {files} files, {Base.format_size(self, size)} in {elapsed:.02f}s ({Base.format_size(self, self.throughput)}/s)'
+        self.data = self.stdout = (data + b'\n' if data else b'') + summary.encode()
+        self.data_error = self.data, self.error
+
+    @property
+    def throughput(self): return self.size / self.elapsed if self.elapsed else 0
+
+
+def run_suffixed(path):
+    # the server, the GUI and the CLI can all transfer to one device at once; each run keeps its own device-side files.
+    return f'{path}.{os.getpid()}_{os.urandom(4).hex()}'
+
+
+class Bulk_Push:
+    # pushes a local folder either with 'adb push' or, for many small files, as one tar stream extracted by the device's tar.
+    tar_min_files = 64
+    tar_max_average = 256 * 1024
+    error_file = '/data/local/tmp/prmp_adb_untar.err'
+    status_file = '/data/local/tmp/prmp_adb_untar.status'
+
+    def __init__(self, src, dest):
+        self.src = str(src)
+        self.dest = str(dest)
+        self.scan()
+
+    def scan(self):
+        self.folders = []
+        self.files = []
+
+        if not os.path.isdir(self.src):
+            if os.path.isfile(self.src): self.files.append((self.src, os.path.getsize(self.src)))
+            return
+
+        stack = [self.src]
+        while stack:
+            path = stack.pop()
+            Task.step('scanning', path)
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        self.folders.append(entry.path)
+                        stack.append(entry.path)
+                    elif entry.is_file(): self.files.append((entry.path, entry.stat().st_size))
+
+    @property
+    def size(self): return sum(size for path, size in self.files)
+
+    @property
+    def mode(self):
+        count = len(self.files)
+        if count >= self.tar_min_files and self.size / count <= self.tar_max_average and ExecOut.is_supported(): return 'tar'
+        return 'push'
+
+    def arcname(self, path, into=True):
+        # into: under dest/<name of src>, else src's contents straight into dest.
+        src = os.path.abspath(self.src).rstrip(os.sep)
+        return os.path.relpath(os.path.abspath(path), os.path.dirname(src) if into else src).replace(os.sep, '/')
+
+    def exec_push(self, quiet=False):
+        start = time.time()
+        process = Push(self.src, self.dest).exec(quiet=quiet)
+        return Transfer_Report('push', len(self.files), self.size, time.time() - start, *process.data_error)
+
+    def exec_tar(self, quiet=False):
+        start = time.time()
+        dest = shlex.quote(self.dest)
+        error_file, status_file = run_suffixed(self.error_file), run_suffixed(self.status_file)
+
+        # like 'adb push': into an existing folder the src folder goes under it, otherwise dest becomes the src folder.
+        into = Shell.exec(['[', '-d', dest, ']', '&&', 'echo', 'into'], 1).data.strip() == b'into'
+        if not into: Shell.exec(['mkdir', '-p', dest], 1)
+        arcname = lambda path: self.arcname(path, into)
+
+        # exec-in brings nothing back from the device, so tar's exit status and errors are left in files and read afterwards.
+        process = ExecIn._exec(['tar', '-xf', '-', '-C', dest, f'2>{error_file};', 'echo', '$?', f'>{status_file}'], stdin=subprocess.PIPE)
+        errors = []
+
+        try:
+            with tarfile.open(fileobj=process.stdin, mode='w|') as tar:
+                tar.add(self.src, arcname(self.src), recursive=False)
+                for folder in self.folders: tar.add(folder, arcname(folder), recursive=False)
+                for path, size in self.files:
+                    Task.step('pushing', path)
+                    info = tar.gettarinfo(path, arcname(path))
+                    with open(path, 'rb') as file: tar.addfile(info, file)
+            process.stdin.close()
+        except OSError as error: errors.append(f'tar stream: {error}')
+
+        data, error = process.stdout.read(), process.stderr.read()
+        process.wait()
+        if error: errors.append(error.decode(errors='replace').strip())
+
+        status = Shell.exec(['cat', status_file], 1).data.strip()
+        errors.extend(line for line in Shell.exec(['cat', error_file], 1).data.decode(errors='replace').splitlines() if line)
+        Shell.exec(['rm', '-f', status_file, error_file], 1)
+        if status != b'0': errors.append(f'device tar exited with {status.decode(errors="replace") or "no status"}')
+
+        files, size = len(self.files), self.size
+        if errors:
+            # only what actually landed on the device is reported.
+            pushed = Shell.exec(['find', shlex.quote(posixpath.normpath(posixpath.join(self.dest, arcname(self.src)))), '-type', 'f', '-exec', 'stat', '-c', '%s', '{}', '+'], 1).data.split()
+            files, size = len(pushed), sum(int(value) for value in pushed if value.isdigit())
+
+        error = '\n'.join(errors).encode()
+        report = Transfer_Report('tar', files, size, time.time() - start, data, error)
+        if error and not quiet:
+            Process.last_error = error
+            raise ADB_Error(error)
+        return report
+
+    def exec(self, quiet=False):
+        # one bulk slot for the whole transfer, its own mkdir/cat/rm included.
+        with Command_Context(priority=BULK), ADB.scheduler.slot():
+            if self.mode == 'tar': return self.exec_tar(quiet)
+            return self.exec_push(quiet)
+
+
+class Bulk_Pull:
+    # pulls many device paths (File/Folder objects straight from the tree, Mapped_Entry ones from a mapped tree, or path strings) as 'tar -c' streamed over exec-out and extracted as it arrives.
+    tar_min_files = 64
+    tar_max_average = 256 * 1024
+    # Windows caps a command line at 32767 characters, and 'adb -s <serial> exec-out "tar ..."' comes on top of the paths.
+    max_args = 24 * 1024
+    error_file = '/data/local/tmp/prmp_adb_tar.err'
+    extract_kwargs = dict(filter='tar') if hasattr(tarfile, 'tar_filter') else {}
+
+    def __init__(self, srcs, dest):
+        if isinstance(srcs, (str, Base, Mapped_Entry)): srcs = [srcs]
+        self.srcs = list(srcs)
+        self.paths = [str(src).rstrip('/') or '/' for src in self.srcs]
+        self.dest = str(dest)
+
+    @property
+    def base(self):
+        if len(self.paths) == 1: return posixpath.dirname(self.paths[0])
+        return posixpath.commonpath(self.paths)
+
+    def counts(self):
+        files = size = 0
+        for src in self.srcs:
+            if isinstance(src, (Folder, Mapped_Entry)) and not src.file:
+                files += src.files_count
+                size += src.full_size
+            elif isinstance(src, (File, Mapped_Entry)):
+                files += 1
+                size += src.full_size
+            else: return 0, 0
+        return files, size
+
+    @property
+    def mode(self):
+        if not ExecOut.is_supported(): return 'pull'
+
+        files, size = self.counts()
+        if files >= self.tar_min_files and size / files <= self.tar_max_average: return 'tar'
+        if len(self.srcs) >= self.tar_min_files: return 'tar'
+        return 'pull'
+
+    def batches(self):
+        base = self.base
+        batch, length = [], 0
+
+        for path in self.paths:
+            rel = shlex.quote(posixpath.relpath(path, base))
+            if batch and length + len(rel) > self.max_args:
+                yield batch
+                batch, length = [], 0
+            batch.append(rel)
+            length += len(rel) + 1
+
+        if batch: yield batch
+
+    def _safe(self, member):
+        name = posixpath.normpath(member.name)
+        return not (name.startswith('/') or name.startswith('..') or member.issym() or member.islnk() or member.isdev())
+
+    def exec_pull(self, quiet=False):
+        start = time.time()
+        data, error = [], []
+        files, size = self.counts()
+
+        for path in self.paths:
+            Task.step('pulling', path)
+            process = Pull(path, self.dest).exec(quiet=1)
+            data.append(process.data)
+            if process.error: error.append(process.error)
+
+        error = b'\n'.join(error)
+        if error and not quiet:
+            Process.last_error = error
+            raise ADB_Error(error)
+
+        return Transfer_Report('pull', files or len(self.paths), size, time.time() - start, b''.join(data), error)
+
+    def exec_tar(self, quiet=False):
+        start = time.time()
+        base = shlex.quote(self.base)
+        extracted, size, errors = [], 0, []
+        os.makedirs(self.dest, exist_ok=True)
+        error_file = run_suffixed(self.error_file)
+
+        for batch in self.batches():
+            # -h: /sdcard is a symlink, and _safe() skips links; shared storage holds no links of its own, so only such operands are affected.
+            process = ExecOut._exec(['tar', '-chf', '-', '-C', base, *batch, f'2>{error_file}'])
+
+            try:
+                with tarfile.open(fileobj=process.stdout, mode='r|') as tar:
+                    for member in tar:
+                        Task.step('pulling', member.name)
+                        if not self._safe(member):
+                            errors.append(f'skipped unsafe entry: {member.name}')
+                            continue
+                        try:
+                            tar.extract(member, self.dest, set_attrs=member.isfile(), **self.extract_kwargs)
+                            if member.isfile():
+                                extracted.append(member.name)
+                                size += member.size
+                        # FilterError: the extraction filter refused it.
+                        except (OSError, tarfile.TarError) as error: errors.append(f'{member.name}: {error}')
+
+            except tarfile.TarError as error:
+                errors.append(f'tar stream: {error}')
+                # the rest of the stream is never read, and adb would block writing it.
+                process.kill()
+
+            # the end-of-archive padding is left after a whole stream.
+            process.communicate()
+            err = Shell.exec(['cat', error_file], 1).data.decode(errors='replace')
+            errors.extend(line for line in err.splitlines() if line)
+
+        Shell.exec(['rm', '-f', error_file], 1)
+
+        error = '\n'.join(errors).encode()
+        report = Transfer_Report('tar', len(extracted), size, time.time() - start, error=error)
+        report.extracted = extracted
+
+        if error and not extracted and not quiet:
+            Process.last_error = error
+            raise ADB_Error(error)
+        return report
+
+    def exec(self, quiet=False):
+        with Command_Context(priority=BULK), ADB.scheduler.slot():
+            if self.mode == 'tar': return self.exec_tar(quiet)
+            return self.exec_pull(quiet)
+
+
+class Base:
+    def get(self, name, default=None): return getattr(self, name, default)
+
+    @property
+    def subs(self): return  []
+
+    def __len__(self):
+        if self.subs: return len(self[:])
+        return 0
+    
+    def __eq__(self, other):
+        if not other: return False
+        if isinstance(other, str): return (str(other) == self.name)
+        return (other.name == self.name) and (other.parent == self.parent)
+    
+    @property
+    def className(self): return self.__class__.__name__
+
+    @property
+    def name(self): return f'{self.className}({self.basename}, size={self.size})'
+
+    def __repr__(self): return f'<{self.name}>'
+    
+    def __str__(self): return self.path
+
+    def __bool__(self): return True
+
+    def __hash__(self): return hash((self.name, self.parent))
+
+    def slash(self, path):
+        if path.startswith('/'): path = path[1:]
+        if path.endswith('/'): path = path[:-1]
+        return path
+    
+    @property
+    def basename(self): return os.path.basename(self.path)
+    
+    def download(self, dest):
+        proc = Pull(self.path, dest).exec()
+        return proc
+    
+    def float_size(self, size):
+        if isinstance(size, bytes): size = size.decode()
+        size = str(size)
+        if not size: size = '0'
+        
+        byte = 1024
+        si_dt = {'K': byte, 'M': byte**2, 'G': byte**3}
+        si = size[-1]
+
+        if si in si_dt:
+            dt = si_dt[si]
+            dat = float(size[:-1]) * dt
+        else: dat = float(size)/2 * byte
+        
+        return dat
+    
+    def format_size(self, size):
+        byte = 1024
+        si_dt = {'K': byte, 'M': byte**2, 'G': byte**3}
+        size = float(size)
+
+        if size >= si_dt['G']: dat = f"{size/si_dt['G']:.02f} G"
+        elif size >= si_dt['M']: dat = f"{size/si_dt['M']:.02f} M"
+        elif size >= si_dt['K']: dat = f"{size/si_dt['K']:.02f} K"
+        else: dat = f"{size:.02f} B"
+
+        return dat
+
+    def pull(self, dest):
+        proc = Pull(self.path, dest).exec()
+        return proc.data_error
+
+
+class File(Base):
+    file = 1
+
+    @property
+    def subs(self): return []
+
+    def __init__(self, parent, path, size):
+        self.parent = parent
+        self.path = path
+        self.full_size = self.float_size(size)
+        self.size = self.format_size(self.full_size)
+
+    @classmethod
+    def made(cls, parent, path, full_size, size):
+        # from a parse_listing record, whose sizes are already worked out.
+        file = cls.__new__(cls)
+        file.parent, file.path, file.full_size, file.size = parent, path, full_size, size
+        return file
+    
+    @property
+    def ext(self): return os.path.splitext(self.basename)[1][1:]
+
+
+class Folder(Base):
+    file = 0
+    changes = 0
+
+    def __init__(self, parent=None, path=''):
+        self.parent = parent
+        self.path = path
+        self.all_folders = self.folders = {}
+        self.files = {}
+
+    def get_parent_folder(self, name):
+        if isinstance(name, bytes): name = name.decode()
+        name = name.lower()
+
+        parent = os.path.dirname(str(name))
+        # print(f'{name} <> "{parent}" <> {[self.path, "/storage"]}')
+
+        if parent in [self.path, '/storage']: return self
+        elif parent in self.all_folders: return self.all_folders.get(parent)
+        # else: raise ValueError(f'{parent} is not in this filesystem')
+
+    def add_folder(self, path):
+        folder = Folder(self, path)
+        self.folders[path.lower()] = folder
+        self.invalidate()
+        return folder
+
+    def add_file(self, path, size='0'):
+        file = File(self, path, size)
+        self.files[path.lower()] = file
+        self.invalidate()
+        return file
+
+    def invalidate(self):
+        # a change also moves every ancestor's sizes and counts, so the size/count views and cached sizes check Folder.changes instead of being cleared up the chain.
+        Folder.changes += 1
+        if self.get('_views'): self._views = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_views', None)
+        state.pop('_full_size', None)
+        return state
+    
+    def create_file(self, path, size='0'):
+        parent = self.get_parent_folder(path)
+        if parent and parent.path != self.path: file = parent.create_file(path, size)
+        else: file = self.add_file(path, size)
+
+        return file
+    
+    def create_folder(self, name):
+        parent = self.get_parent_folder(name)
+        if parent and parent.path != self.path: folder = parent.create_folder(name)
+        else: folder = self.add_folder(name)
+
+        return folder
+    
+    def view(self, order='', reverse=False):
+        views = self.get('_views')
+        if views is None: views = self._views = {}
+
+        key = order, reverse
+        view = views.get(key)
+        if view is None or (view.deep and view.changes != Folder.changes): view = views[key] = Children_View(self, order, reverse)
+        return view
+
+    def page(self, index, size, order='', reverse=False): return self.view(order, reverse).page(index, size)
+
+    @property
+    def folder_s(self): return self.view().folder_s
+    
+    @property
+    def subs(self): return self.view().items
+
+    @property
+    def file_s(self): return self.view().file_s
+
+    def __len__(self): return len(self.folders) + len(self.files)
+
+    def __iter__(self): return itertools.chain(self.folders.values(), self.files.values())
+    
+    def __getitem__(self, item): return self.view()[item]
+        
+    def get_folder(self, folder):
+        folder = f'{self.path}/{self.slash(folder)}'.lower()
+        return self.folders.get(folder)
+    
+    # the aggregates walk the dicts directly, a view per descendant folder would stay cached in all of them.
+    @property
+    def folders_count(self):
+        count = len(self.folders)
+        for folder in self.folders.values(): count += folder.folders_count
+        return count
+
+    @property
+    def files_count(self):
+        count = len(self.files)
+        for folder in self.folders.values(): count += folder.files_count
+        return count
+    
+    @property
+    def full_size(self):
+        cached = self.get('_full_size')
+        if cached and cached[0] == Folder.changes: return cached[1]
+
+        size = sum([float(file.full_size) for file in self.files.values()])
+        for folder in self.folders.values(): size += folder.full_size
+        self._full_size = Folder.changes, size
+        return size
+    
+    @property
+    def size(self): return self.format_size(self.full_size)
+
+
+class Root_Directory(Folder):
+    path = '/'
+
+    def __init__(self, device):
+        super().__init__(device, self.path)
+        self.device = device
+        
+        self.all_folders = {}
+        self.all_files = {}
+        self.load_paths = []
+        self.stats = None
+
+        if device.filesystems:
+            strs_fs = [fs.mounted_on for fs in device.filesystems[-2:]]
+            if strs_fs[0] != DEFAULT_PATH: strs_fs = ['/sdcard']
+
+            for fs in strs_fs: self.load(fs)
+
+    @property
+    def basename(self): return self.path
+
+    def find_folder(self, path): return self.all_folders.get(path.lower())
+
+    def create_file(self, path, size='0'):
+        file = super().create_file(path, size)
+        self.all_files[file.path.lower()] = file
+        return file
+    
+    def create_folder(self, path):
+        folder = super().create_folder(path)
+        self.all_folders[folder.path.lower()] = folder
+        return folder
+
+    parallel_lines = 200000
+    # the pool only pays off where benchmark_parse measured it to; until then every listing is parsed serially.
+    parallel_workers = 1
+    parallel_gain = 1.3
+
+    @property
+    def serial(self): return self.device.unique if isinstance(self.device, Device) else None
+
+    def load(self, path, workers=None):
+        if path == DEFAULT_PATH: path = '/sdcard'
+
+        # a full listing is the heaviest thing a scan does, it must not hold up interactive commands.
+        Task.step('listing', path)
+        with Command_Context(self.serial, BULK): data, error = ExecOut.transport().exec(f'ls {path} -pRhs', 1).data_error
+        Task.step('parsing', path)
+        data = data.decode()
+        # data = path
+
+        if not data: raise ADB_Error(f'An error must have occured, no data to parse.', error)
+
+        if path not in self.load_paths: self.load_paths.append(path)
+
+        if workers is None: workers = self.parallel_workers if data.count('\n') >= self.parallel_lines else 1
+
+        if workers > 1: self.parse_parallel(data, workers)
+        else: self.parse(data)
+
+    def parse(self, data):
+        lines = data.splitlines()
+        last_folder = ''
+
+        for line in lines:
+            if line:
+                if line.endswith(':'):
+                    last_folder = self.create_folder(line[:-1]).path
+                    Task.step('parsing', last_folder)
+
+                if 'total ' in line or line.endswith('/') or line.endswith(':'): continue
+
+                line = line.lstrip(' ')
+                a = line.split(' ', 1)
+                a.reverse()
+
+                file_path = f'{last_folder}/{a[0]}'
+                a[0] = file_path
+
+                # if last_folder:
+                #     file = last_folder.add_file(a[0], a[1])
+                #     self.all_files[file.path] = file
+                self.create_file(*a)
+
+    def parse_parallel(self, data, workers=None):
+        workers = workers or os.cpu_count() or 1
+        chunks = split_listing(data, workers * 4)
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor: blocks = executor.map(parse_listing, chunks)
+
+        all_folders, all_files = self.all_folders, self.all_files
+        last_folder, folder = '', self
+
+        for chunk in blocks:
+            Task.step('parsing', last_folder)
+            for header, records in chunk:
+                if header is not None:
+                    last_folder = self.create_folder(header).path
+                    parent = last_folder.lower()
+                    folder = self if parent in [self.path, '/storage'] else all_folders.get(parent, self)
+
+                # same placement Root_Directory.create_file would pick, without resolving the parent per file; the workers did the rest.
+                files = folder.files
+                for path, key, full_size, size in records: files[key] = all_files[key] = File.made(folder, path, full_size, size)
+                folder.invalidate()
+
+    def same_tree(self, other):
+        if self.all_folders.keys() != other.all_folders.keys() or self.all_files.keys() != other.all_files.keys(): return False
+
+        for key, file in self.all_files.items():
+            file2 = other.all_files[key]
+            if (file.path, file.full_size, file.size, file.parent.path) != (file2.path, file2.full_size, file2.size, file2.parent.path): return False
+
+        for key, folder in self.all_folders.items():
+            folder2 = other.all_folders[key]
+            if (folder.path, folder.parent.path, len(folder)) != (folder2.path, folder2.parent.path, len(folder2)): return False
+
+        return True
+
+    @classmethod
+    def benchmark_parse(cls, data, workers=None):
+        # parses the same listing serially and with 2, 4 ... cores, checking every result against the serial tree.
+        workers = workers or sorted({n for n in (1, 2, 4, 8, 16, os.cpu_count() or 1) if n <= (os.cpu_count() or 1)})
+        results, serial = {}, None
+
+        for count in workers:
+            root = cls.__new__(cls)
+            Folder.__init__(root, None, cls.path)
+            root.all_folders, root.all_files = {}, {}
+
+            start = time.time()
+            if count > 1: root.parse_parallel(data, count)
+            else: root.parse(data)
+            elapsed = time.time() - start
+
+            if serial is None: serial = root
+            results[count] = dict(seconds=elapsed, speedup=results[workers[0]]['seconds'] / elapsed if results else 1, identical=serial.same_tree(root))
+
+        # load() turns the pool on for the fastest count, if that was a real gain.
+        best = max(results, key=lambda count: results[count]['speedup'])
+        gained = results[best]['speedup'] >= cls.parallel_gain and all(result['identical'] for result in results.values())
+        Root_Directory.parallel_workers = best if gained else 1
+        return results
+
+    def rescan(self): self.swap(self.fetch())
+
+    def fetch(self):
+        # lists and parses into a detached copy (off the Tk thread), so whatever shows this tree keeps a whole one until swap().
+        fresh = type(self).__new__(type(self))
+        Folder.__init__(fresh, self.device, self.path)
+        fresh.device = self.device
+        fresh.all_folders, fresh.all_files, fresh.load_paths, fresh.stats = {}, {}, [], None
+
+        for path in self.get('load_paths') or [folder.path for folder in self.folder_s]: fresh.load(path)
+        fresh.snapshot = Snapshot(fresh) if isinstance(self.device, Device) else None
+        return fresh
+
+    def swap(self, fresh):
+        # the cheap half of a rescan, for the thread that owns the tree.
+        old_folders, old_files = self.all_folders, self.all_files
+
+        self.folders, self.files = fresh.folders, fresh.files
+        self.all_folders, self.all_files, self.load_paths = fresh.all_folders, fresh.all_files, fresh.load_paths
+        for obj in itertools.chain(self.folders.values(), self.files.values()): obj.parent = self
+        self.invalidate()
+
+        if self.get('stats'): self.stats.update(old_folders, old_files)
+        if fresh.snapshot: self.device.take_snapshot(fresh.snapshot)
+        self.updated = time.time()
+
+    def remove(self, obj):
+        parent = obj.parent
+        (parent.files if obj.file else parent.folders).pop(obj.path.lower(), None)
+        parent.invalidate()
+        stats = self.get('stats')
+
+        if obj.file:
+            self.all_files.pop(obj.path.lower(), None)
+            if stats: stats.remove(obj)
+        else:
+            for child in list(obj): self.remove(child)
+            self.all_folders.pop(obj.path.lower(), None)
+            if stats: stats.remove_folder(obj)
+
+    def sync_folder(self, path, entries):
+        # makes a scanned folder's children match one 'ls -ps' block of [(name, size, is_folder)], keeping the indexes and stats in step; returns the folder.
+        folder = self.find_folder(path)
+        if folder is None: return
+
+        stats = self.get('stats')
+        listed = set()
+
+        for name, size, is_folder in entries:
+            child = f'{folder.path}/{name}'
+            key = child.lower()
+            listed.add(key)
+
+            if is_folder:
+                if key not in self.all_folders:
+                    new = self.create_folder(child)
+                    if stats: stats.add_folder(new)
+                continue
+
+            file = self.all_files.get(key)
+            if file is None:
+                file = self.create_file(child, size)
+                if stats: stats.add(file)
+
+            elif file.float_size(size) != file.full_size:
+                if stats: stats.remove(file)
+                file.full_size = file.float_size(size)
+                file.size = file.format_size(file.full_size)
+                if stats: stats.add(file)
+                folder.invalidate()
+
+        for key, obj in list(itertools.chain(folder.folders.items(), folder.files.items())):
+            if key not in listed: self.remove(obj)
+
+        self.updated = time.time()
+        return folder
+
+    def search(self, path, case=False, match=False):
+        files, folders = [], []
+        if not case: path = path.lower()
+
+        for alls in [self.all_folders, self.all_files]:
+            for index, (ff, obj) in enumerate(alls.items()):
+                if not index % 10000: Task.step('searching', f'{len(folders) + len(files)} found')
+                comp_path = obj.path if case else ff
+                in_path = comp_path.split('/')[-1]
+
+                if match: valid = path == in_path
+                else: valid = path in in_path
+
+                if valid:
+                    lis = files if obj.file else folders
+                    lis.append(obj)
+
+        return folders, files
+
+    @property
+    def storage_stats(self):
+        if not self.get('stats'): self.stats = Storage_Stats(self)
+        return self.stats
+
+
+def split_listing(data, parts):
+    # cuts an 'ls -R' listing into about `parts` chunks, only ever at a 'path:' header.
+    size = max(len(data) // max(parts, 1), 1)
+    chunks, start = [], 0
+
+    while start < len(data):
+        end = start + size
+        if end >= len(data):
+            chunks.append(data[start:])
+            break
+
+        while True:
+            newline = data.find('\n', end)
+            if newline < 0:
+                end = len(data)
+                break
+            line_end = data.find('\n', newline + 1)
+            line = data[newline+1:line_end if line_end >= 0 else len(data)].rstrip('\r')
+            end = newline + 1
+            if line.endswith(':'): break
+
+        chunks.append(data[start:end])
+        start = end
+
+    return chunks
+
+
+def parse_listing(data):
+    # process-pool worker for Root_Directory.parse_parallel; [(header or None, [(path, key, full_size, size), ...]), ...] in listing order.
+    # everything per file but the File itself is done here; only the first chunk can start without a header, and like parse() it then has no folder prefix.
+    blocks = [(None, [])]
+    files, folder = blocks[0][1], ''
+    float_size, format_size = Base.float_size, Base.format_size
+    formatted = {}
+
+    for line in data.splitlines():
+        if line:
+            if line.endswith(':'):
+                files, folder = [], line[:-1]
+                blocks.append((folder, files))
+
+            if 'total ' in line or line.endswith('/') or line.endswith(':'): continue
+
+            a = line.lstrip(' ').split(' ', 1)
+            size, name = a if len(a) == 2 else ('0', a[0])
+            path = f'{folder}/{name}'
+
+            # sizes repeat a lot in '-h' output.
+            sizes = formatted.get(size)
+            if sizes is None:
+                full_size = float_size(None, size)
+                sizes = formatted[size] = full_size, format_size(None, full_size)
+            files.append((path, path.lower(), *sizes))
+
+    if not blocks[0][1]: del blocks[0]
+    return blocks
+
+
+class Children_View:
+    # sorted snapshot of a folder's children, folders first; Folder.view caches it until add_folder/add_file invalidates it.
+    orders = dict(
+        name=lambda obj: obj.basename.lower(),
+        size=lambda obj: obj.full_size,
+        type=lambda obj: obj.ext.lower() if obj.file else '',
+        count=lambda obj: 0 if obj.file else len(obj),
+    )
+
+    def __init__(self, folder, order='', reverse=False):
+        self.folder = folder
+        self.order = order
+        self.reverse = reverse
+        # size and count depend on descendants, whose changes don't reach this folder's cache.
+        self.deep = order in ('size', 'count')
+        self.changes = Folder.changes
+
+        if isinstance(folder, Folder): folders, files = list(folder.folders.values()), list(folder.files.values())
+        else:
+            folders, files = [], []
+            for obj in folder: (files if obj.file else folders).append(obj)
+
+        key = self.orders.get(order)
+        if key:
+            folders.sort(key=key, reverse=reverse)
+            files.sort(key=key, reverse=reverse)
+
+        # tuples, so callers can't reorder what the cached view holds.
+        self.folder_s = tuple(folders)
+        self.file_s = tuple(files)
+        self.items = self.folder_s + self.file_s
+
+    def __len__(self): return len(self.items)
+
+    def __iter__(self): return iter(self.items)
+
+    def __getitem__(self, item): return self.items[item]
+
+    def pages_count(self, size): return max(1, -(-len(self.items) // size))
+
+    def page(self, index, size):
+        start = index * size
+        return list(self.items[start:start+size])
+
+    def pages(self, size):
+        for start in range(0, len(self.items), size): yield list(self.items[start:start+size])
+
+
+MEDIA_TYPES = dict(
+    image=['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp', 'heic', 'heif', 'tif', 'tiff', 'ico', 'svg'],
+    video=['mp4', 'mkv', '3gp', 'avi', 'mov', 'webm', 'flv', 'wmv', 'm4v', 'ts'],
+    audio=['mp3', 'm4a', 'aac', 'wav', 'ogg', 'opus', 'amr', 'flac', 'wma', 'mid'],
+    document=['pdf', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'txt', 'rtf', 'odt', 'csv', 'epub', 'hlp', 'html', 'htm', 'xml', 'json'],
+    archive=['zip', 'rar', '7z', 'tar', 'gz', 'tgz', 'bz2', 'xz', 'iso'],
+    application=['apk', 'apks', 'xapk', 'obb', 'dex', 'so', 'jar', 'exe', 'dll', 'py', 'pyc'],
+)
+EXT_MEDIA = {ext: media for media, exts in MEDIA_TYPES.items() for ext in exts}
+
+
+class Storage_Stats:
+    # computes every breakdown in one pass over root.all_folders and root.all_files, then stays up to date through add/remove.
+    top = 20
+
+    def __init__(self, root):
+        self.root = root
+        self.scan()
+
+    def scan(self):
+        self.extensions = {}
+        self.media_types = {}
+        self.top_folders = {}
+        self.folder_sizes = {}
+        self.total = [0, 0]
+        self._largest_files = None
+
+        for folder in self.root.all_folders.values(): self.add_folder(folder)
+        for file in self.root.all_files.values(): self.add(file)
+
+    def base_of(self, path):
+        for base in self.root.folders:
+            if path == base or path.startswith(base + '/'): return base
+
+    def top_folder(self, path):
+        base = self.base_of(path)
+        if not base: return os.path.dirname(path)
+
+        rest = path[len(base)+1:].split('/', 1)
+        if len(rest) == 1: return base
+        return f'{base}/{rest[0]}'
+
+    @staticmethod
+    def _count(dict_, key, size, sign, index=1):
+        # [size, files, folders]
+        value = dict_.get(key)
+        if not value: value = dict_[key] = [0, 0, 0]
+        value[0] += size
+        value[index] += sign
+
+    def add_folder(self, folder, sign=1):
+        path = folder.path.lower()
+        if path not in self.folder_sizes: self.folder_sizes[path] = [0, 0, 0]
+
+        top = self.top_folder(path)
+        if top != path: self._count(self.top_folders, top, 0, sign, 2)
+
+    def remove_folder(self, folder):
+        self.add_folder(folder, -1)
+        self.folder_sizes.pop(folder.path.lower(), None)
+
+    def _apply(self, file, sign):
+        path = file.path.lower()
+        size = file.full_size * sign
+        ext = file.ext.lower()
+
+        self.total[0] += size
+        self.total[1] += sign
+
+        self._count(self.extensions, ext, size, sign)
+        self._count(self.media_types, EXT_MEDIA.get(ext, 'other'), size, sign)
+        self._count(self.top_folders, self.top_folder(path), size, sign)
+
+        base = self.base_of(path)
+        parent = os.path.dirname(path)
+        while parent:
+            self._count(self.folder_sizes, parent, size, sign)
+            if parent == base or parent == '/': break
+            parent = os.path.dirname(parent)
+
+    def add(self, file):
+        self._apply(file, 1)
+
+        largest = self._largest_files
+        if largest is not None and (len(largest) < self.top or file.full_size > largest[-1].full_size):
+            largest.append(file)
+            largest.sort(key=lambda f: f.full_size, reverse=True)
+            del largest[self.top:]
+
+    def remove(self, file):
+        self._apply(file, -1)
+        largest = self._largest_files
+        if largest and file.full_size >= largest[-1].full_size: self._largest_files = None
+
+    def update(self, old_folders, old_files):
+        new_folders, new_files = self.root.all_folders, self.root.all_files
+
+        # files leave before their folders do, or removing them would count the folders back in.
+        for key, file in old_files.items():
+            new = new_files.get(key)
+            if (new is None) or (new.full_size != file.full_size): self.remove(file)
+
+        for key, folder in old_folders.items():
+            if key not in new_folders: self.remove_folder(folder)
+        for key, folder in new_folders.items():
+            if key not in old_folders: self.add_folder(folder)
+
+        for key, file in new_files.items():
+            old = old_files.get(key)
+            if (old is None) or (old.full_size != file.full_size): self.add(file)
+
+        # the old file objects may still be referenced.
+        self._largest_files = None
+
+    def largest_files(self, n=None):
+        n = n or self.top
+        if self._largest_files is None or n > self.top:
+            largest = heapq.nlargest(max(n, self.top), self.root.all_files.values(), key=lambda f: f.full_size)
+            self._largest_files = largest[:self.top]
+            return largest[:n]
+        return self._largest_files[:n]
+
+    def largest_folders(self, n=None):
+        items = heapq.nlargest(n or self.top, self.folder_sizes.items(), key=lambda item: item[1][0])
+        return [self.root.all_folders.get(path, path) for path, value in items]
+
+    def folder_size(self, folder):
+        value = self.folder_sizes.get(str(folder).lower())
+        return value[0] if value else 0
+
+    def _rows(self, dict_):
+        return sorted(([key, *value] for key, value in dict_.items() if value[1] or value[2]), key=lambda row: row[1], reverse=True)
+
+    def by_extension(self): return self._rows(self.extensions)
+
+    def by_media_type(self): return self._rows(self.media_types)
+
+    def by_top_folder(self): return self._rows(self.top_folders)
+
+    def summary(self):
+        return dict(size=self.total[0], files=self.total[1], folders=len(self.folder_sizes), extensions=self.by_extension(), media_types=self.by_media_type(), top_folders=self.by_top_folder(), largest_files=[[f.path, f.full_size] for f in self.largest_files()], largest_folders=[[str(f), self.folder_size(f)] for f in self.largest_folders()])
+
+    def treemap(self, folder=None, depth=None, min_size=0):
+        folder = folder or self.root
+        node = dict(name=folder.basename, path=folder.path, size=self.folder_size(folder) if folder is not self.root else self.total[0])
+        if depth == 0: return node
+
+        children = []
+        depth = None if depth is None else depth - 1
+
+        for sub in folder.folders.values():
+            if self.folder_size(sub) >= min_size: children.append(self.treemap(sub, depth, min_size))
+
+        for file in folder.files.values():
+            if file.full_size >= min_size: children.append(dict(name=file.basename, path=file.path, size=file.full_size, type=EXT_MEDIA.get(file.ext.lower(), 'other')))
+
+        if children: node['children'] = children
+        return node
+
+    def export_json(self, path, **kwargs):
+        with open(path, 'w') as file: json.dump(self.treemap(**kwargs), file)
+
+
+class Snapshot:
+    # flat, path-sorted copy of a Root_Directory; folders are stored with kind 0 and size 0.
+    # paths are the lowercased keys the merge sorts and matches on, names the paths as the device has them.
+
+    def __init__(self, root):
+        self.time = time.time()
+
+        entries = [(key, file.full_size, 1, file.path) for key, file in root.all_files.items()]
+        entries += [(key, 0, 0, folder.path) for key, folder in root.all_folders.items()]
+        entries.sort()
+
+        self.paths = [entry[0] for entry in entries]
+        self.sizes = [entry[1] for entry in entries]
+        self.kinds = [entry[2] for entry in entries]
+        # the key itself where the case already matches, so most names cost nothing.
+        self.names = [entry[0] if entry[3] == entry[0] else entry[3] for entry in entries]
+
+    def __len__(self): return len(self.paths)
+
+    def __repr__(self): return f'<Snapshot({time.ctime(self.time)}, entries={len(self)})>'
+
+    @property
+    def size(self): return sum(self.sizes)
+
+    def diff(self, other): return Snapshot_Diff(self, other)
+
+
+class Snapshot_Diff:
+    # linear merge of two Snapshots; iterating streams (change, path, old_size, new_size, kind) while folder_deltas gets the byte rollups.
+    ADDED, REMOVED, RESIZED = 'added', 'removed', 'resized'
+
+    def __init__(self, old, new):
+        self.old = old
+        self.new = new
+        self.folder_deltas = {}
+        self.counts = {self.ADDED: 0, self.REMOVED: 0, self.RESIZED: 0}
+        self.done = False
+
+    def __iter__(self): return self.changes()
+
+    def _rollup(self, path, delta):
+        deltas = self.folder_deltas
+        parent = os.path.dirname(path)
+        while True:
+            deltas[parent] = deltas.get(parent, 0) + delta
+            if parent == '/' or not parent: break
+            parent = os.path.dirname(parent)
+
+    def _change(self, change, path, old, new, kind):
+        self.counts[change] += 1
+        if new != old: self._rollup(path, new - old)
+        return change, path, old, new, kind
+
+    def changes(self):
+        self.folder_deltas = {}
+        self.counts = dict.fromkeys(self.counts, 0)
+
+        old, new = self.old, self.new
+        old_paths, old_sizes, old_kinds = old.paths, old.sizes, old.kinds
+        new_paths, new_sizes, new_kinds = new.paths, new.sizes, new.kinds
+        # snapshots saved before names were kept only have the keys.
+        old_names, new_names = getattr(old, 'names', old_paths), getattr(new, 'names', new_paths)
+        i = j = 0
+        len_old, len_new = len(old_paths), len(new_paths)
+
+        while i < len_old and j < len_new:
+            a, b = old_paths[i], new_paths[j]
+            if a == b:
+                if old_sizes[i] != new_sizes[j] or old_kinds[i] != new_kinds[j]: yield self._change(self.RESIZED, new_names[j], old_sizes[i], new_sizes[j], new_kinds[j])
+                i += 1
+                j += 1
+            elif a < b:
+                yield self._change(self.REMOVED, old_names[i], old_sizes[i], 0, old_kinds[i])
+                i += 1
+            else:
+                yield self._change(self.ADDED, new_names[j], 0, new_sizes[j], new_kinds[j])
+                j += 1
+
+        for i in range(i, len_old): yield self._change(self.REMOVED, old_names[i], old_sizes[i], 0, old_kinds[i])
+        for j in range(j, len_new): yield self._change(self.ADDED, new_names[j], 0, new_sizes[j], new_kinds[j])
+
+        self.done = True
+
+    def run(self): return list(self.changes())
+
+    def rollups(self, n=None):
+        if not self.done: self.run()
+        items = sorted(self.folder_deltas.items(), key=lambda item: abs(item[1]), reverse=True)
+        return items[:n] if n else items
+
+    def export(self, path):
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['change', 'path', 'old_size', 'new_size', 'kind'])
+            for change in self.changes(): writer.writerow(change[:4] + ('file' if change[4] else 'folder',))
+
+
+class Mapped_Entry:
+    __slots__ = ('tree', 'index', 'parent_index', 'first_child', 'child_count', 'file', 'name', 'full_size', 'mtime', '_path')
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+        self._path = None
+
+        self.parent_index, self.first_child, self.child_count, flags, offset, length, self.full_size, self.mtime = tree.record.unpack_from(tree.mm, tree.entries_offset + index * tree.record.size)
+        self.file = flags & 1
+        start = tree.strings_offset + offset
+        self.name = tree.mm[start:start+length].decode()
+
+    @property
+    def parent(self): return self.tree.entry(self.parent_index) if self.parent_index >= 0 else None
+
+    @property
+    def path(self):
+        if self._path is None:
+            parent = self.parent
+            if not parent or self.name.startswith('/'): self._path = self.name
+            else: self._path = f"{parent.path.rstrip('/')}/{self.name}"
+        return self._path
+
+    @property
+    def basename(self): return posixpath.basename(self.name) or self.name
+
+    @property
+    def ext(self): return os.path.splitext(self.basename)[1][1:] if self.file else ''
+
+    @property
+    def size(self): return Base.format_size(self, self.full_size)
+
+    def __len__(self): return self.child_count
+
+    def __iter__(self):
+        for index in range(self.first_child, self.first_child + self.child_count): yield self.tree.entry(index)
+
+    def __getitem__(self, item):
+        indexes = range(self.first_child, self.first_child + self.child_count)[item]
+        if isinstance(indexes, int): return self.tree.entry(indexes)
+        return [self.tree.entry(index) for index in indexes]
+
+    @property
+    def subs(self): return self[:]
+
+    @property
+    def files_count(self): return sum(1 if entry.file else entry.files_count for entry in self)
+
+    @property
+    def folders_count(self): return sum(0 if entry.file else 1 + entry.folders_count for entry in self)
+
+    def find_folder(self, path):
+        entry = self.tree.find(path)
+        if entry and not entry.file: return entry
+
+    def __str__(self): return self.path
+
+    def __repr__(self): return f"<Mapped{'File' if self.file else 'Folder'}({self.basename}, size={self.size})>"
+
+
+class Mapped_Tree:
+    # read-only tree in one file: header, fixed-size entry records in breadth-first order (so children are contiguous), the names and a sorted path hash index.
+    magic = b'PRMPTREE'
+    version = 1
+    header = struct.Struct('<8sIIQQQQ')
+    record = struct.Struct('<iIIIIIQq')
+    index_record = struct.Struct('<QI')
+
+    @staticmethod
+    def key(path): return int.from_bytes(hashlib.blake2b(path.lower().encode(), digest_size=8).digest(), 'little')
+
+    @classmethod
+    def write(cls, root, path):
+        entries = [(root, -1, '/')]
+        children = []
+        i = 0
+
+        while i < len(entries):
+            obj, parent, obj_path = entries[i]
+            if obj.file: children.append((0, 0))
+            else:
+                subs = [*obj.folders.values(), *obj.files.values()]
+                children.append((len(entries), len(subs)))
+                entries.extend((sub, i, sub.path) for sub in subs)
+            i += 1
+
+        sizes = [obj.full_size if obj.file else 0 for obj, parent, obj_path in entries]
+        for i in range(len(entries)-1, 0, -1): sizes[entries[i][1]] += sizes[i]
+
+        strings, blob = {}, bytearray()
+        records, index = [], []
+
+        for i, (obj, parent, obj_path) in enumerate(entries):
+            name = obj_path if parent == 0 or parent < 0 else posixpath.basename(obj_path)
+            data = name.encode()
+            offset = strings.get(data)
+            if offset is None:
+                offset = strings[data] = len(blob)
+                blob += data
+
+            records.append(cls.record.pack(parent, *children[i], obj.file, offset, len(data), int(sizes[i]), int(obj.get('mtime') or 0)))
+            index.append((cls.key(obj_path), i))
+
+        index.sort()
+        entries_offset = cls.header.size
+        strings_offset = entries_offset + len(records) * cls.record.size
+        index_offset = strings_offset + len(blob)
+
+        # into a temp file renamed over the old one: truncating a tree someone has mapped would crash their reads.
+        temp = f'{path}.{os.getpid()}.tmp'
+        with open(temp, 'wb') as file:
+            file.write(cls.header.pack(cls.magic, cls.version, len(records), entries_offset, strings_offset, len(blob), index_offset))
+            file.write(b''.join(records))
+            file.write(blob)
+            file.write(b''.join(cls.index_record.pack(*item) for item in index))
+        os.replace(temp, path)
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self.mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.count, self.entries_offset, self.strings_offset, self.strings_size, self.index_offset = self.header.unpack_from(self.mm, 0)
+        if magic != self.magic or version != self.version: raise ADB_Error(f'{path} is not a mapped tree.')
+
+        self._entries = {}
+
+    def close(self):
+        self.mm.close()
+        self._file.close()
+
+    def __len__(self): return self.count
+
+    def entry(self, index):
+        entry = self._entries.get(index)
+        if entry is None:
+            if len(self._entries) > 100000: self._entries.clear()
+            entry = self._entries[index] = Mapped_Entry(self, index)
+        return entry
+
+    @property
+    def root(self): return self.entry(0)
+
+    def find(self, path):
+        path = path.rstrip('/') or '/'
+        key = self.key(path)
+        size = self.index_record.size
+        lo, hi = 0, self.count
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.index_record.unpack_from(self.mm, self.index_offset + mid * size)[0] < key: lo = mid + 1
+            else: hi = mid
+
+        while lo < self.count:
+            found, index = self.index_record.unpack_from(self.mm, self.index_offset + lo * size)
+            if found != key: break
+            entry = self.entry(index)
+            if entry.path.lower() == path.lower(): return entry
+            lo += 1
+
+
+class Mirror_Plan:
+    def __init__(self):
+        self.pull = []
+        self.skip = []
+        self.prune = []
+        # why nothing was pruned, when the device listing couldn't be trusted for it.
+        self.unpruned = ''
+
+    @property
+    def pull_bytes(self): return sum(entry[1] for entry in self.pull)
+
+    @property
+    def skip_bytes(self): return sum(entry[1] for entry in self.skip)
+
+    @property
+    def prune_bytes(self): return sum(entry[1] for entry in self.prune)
+
+    def __str__(self):
+        text = f'{len(self.pull)} files ({Base.format_size(self, self.pull_bytes)}) to pull, {len(self.skip)} files ({Base.format_size(self, self.skip_bytes)}) up to date, {len(self.prune)} files ({Base.format_size(self, self.prune_bytes)}) to prune'
+        return f'{text}, not pruning: {self.unpruned}' if self.unpruned else text
+
+
+class Mirror:
+    # one-way sync of a device folder into a local directory; entries are (relative path, size, mtime).
+    mtime_slack = 2
+    serial = None
+
+    def __init__(self, folder, dest, workers=4, checksum=False, prune=False):
+        self.folder = folder
+        self.src = str(folder).rstrip('/') or '/'
+        self.dest = dest
+        self.workers = workers
+        self.checksum = checksum
+        self.prune = prune
+
+    def relative(self, path): return path[len(self.src):].lstrip('/')
+
+    def local_path(self, rel): return os.path.join(self.dest, *rel.split('/'))
+
+    def device_entries(self):
+        # folders come too (%f is the hex mode), so plan() knows which ones were really listed; -H and -L as /sdcard is a symlink.
+        data, error = ExecOut.transport().exec(['find', '-H', shlex.quote(self.src), shlex.quote('('), '-type', 'f', '-o', '-type', 'd', shlex.quote(')'), '-exec', 'stat', '-L', '-c', shlex.quote('%f %s %Y %n'), '{}', '+'], 1).data_error
+        entries, self.listed, self.unreadable, self.unpruned = {}, set(), set(), ''
+
+        for line in data.decode(errors='replace').splitlines():
+            parts = line.split(' ', 3)
+            if len(parts) != 4 or not parts[1].isdigit(): continue
+
+            rel = self.relative(parts[3])
+            if int(parts[0], 16) & 0o170000 == 0o040000: self.listed.add(rel)
+            else: entries[rel] = int(parts[1]), int(parts[2])
+
+        # find still lists a folder it can't read (Android/data since Android 11), it just can't go into it.
+        for line in error.decode(errors='replace').splitlines():
+            start, end = line.find(self.src), line.rfind(':')
+            if start >= 0 and end > start: self.unreadable.add(self.relative(line[start:end].strip('\'"‘’ ')))
+
+        if '' not in self.listed: self.unpruned = f'{self.src} could not be listed'
+        if entries or not isinstance(self.folder, Folder): return entries
+
+        # stat is not available, fall back to the (rounded) sizes from the scanned tree; a scan can be old, so it never prunes.
+        self.unpruned = self.unpruned or 'stat is not available on the device'
+        stack = [self.folder]
+        while stack:
+            folder = stack.pop()
+            stack.extend(folder.folders.values())
+            for file in folder.files.values(): entries[self.relative(file.path)] = int(file.full_size), None
+        return entries
+
+    def local_entries(self):
+        entries = {}
+        stack = [self.dest]
+
+        while stack:
+            path = stack.pop()
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False): stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            stat = entry.stat()
+                            rel = os.path.relpath(entry.path, self.dest).replace(os.sep, '/')
+                            entries[rel] = stat.st_size, int(stat.st_mtime)
+            except FileNotFoundError: ...
+
+        return entries
+
+    def device_checksums(self, rels):
+        sums = {}
+        paths = [shlex.quote(f'{self.src}/{rel}') for rel in rels]
+
+        for start in range(0, len(paths), 200):
+            data = ExecOut.transport().exec(['md5sum', *paths[start:start+200]], 1).data
+            for line in data.decode(errors='replace').splitlines():
+                parts = line.split(None, 1)
+                if len(parts) == 2: sums[self.relative(parts[1].strip())] = parts[0]
+        return sums
+
+    def local_checksum(self, rel):
+        md5 = hashlib.md5()
+        with open(self.local_path(rel), 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''): md5.update(chunk)
+        return md5.hexdigest()
+
+    def plan(self):
+        plan = Mirror_Plan()
+        device, local = self.device_entries(), self.local_entries()
+        same = []
+
+        for rel, (size, mtime) in device.items():
+            entry = local.get(rel)
+            if not entry: plan.pull.append((rel, size, mtime, 'new'))
+            elif entry[0] != size and mtime is not None: plan.pull.append((rel, size, mtime, 'size'))
+            elif mtime is not None and abs(entry[1] - mtime) > self.mtime_slack and not self.checksum: plan.pull.append((rel, size, mtime, 'mtime'))
+            else: same.append((rel, size, mtime))
+
+        if self.checksum and same:
+            sums = self.device_checksums([entry[0] for entry in same])
+            for rel, size, mtime in same:
+                if sums.get(rel) != self.local_checksum(rel): plan.pull.append((rel, size, mtime, 'checksum'))
+                else: plan.skip.append((rel, size, mtime, ''))
+        else: plan.skip.extend(entry + ('',) for entry in same)
+
+        plan.unpruned = self.unpruned
+        if self.prune and not plan.unpruned: plan.prune = [(rel, size, mtime, 'removed') for rel, (size, mtime) in local.items() if rel not in device and self.prunable(rel)]
+
+        return plan
+
+    def prunable(self, rel):
+        # only where the device folder was read: the nearest folder that was listed must not be one find couldn't go into.
+        folder = posixpath.dirname(rel)
+        while folder not in self.listed: folder = posixpath.dirname(folder)
+        return folder not in self.unreadable
+
+    def _pull(self, entry):
+        rel, size, mtime, reason = entry
+        dest = self.local_path(rel)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+
+        with Command_Context(self.serial, BULK): data, error = Pull(f'{self.src}/{rel}', dest).exec(quiet=1).data_error
+        if error or b'adb: error' in data: return entry, (error or data).decode(errors='replace')
+
+        if mtime is not None: os.utime(dest, (mtime, mtime))
+        return entry, ''
+
+    def run(self, plan=None, dry_run=False, callback=None):
+        plan = plan or self.plan()
+        # the pool threads don't see this thread's Command_Context.
+        self.serial = Command_Context.current()[0]
+        summary = dict(plan=plan, transferred=0, transferred_bytes=0, skipped=len(plan.skip), skipped_bytes=plan.skip_bytes, pruned=0, errors=[])
+        if dry_run: return summary
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            for entry, error in executor.map(self._pull, plan.pull):
+                if error: summary['errors'].append((entry[0], error))
+                else:
+                    summary['transferred'] += 1
+                    summary['transferred_bytes'] += entry[1]
+                # the callback may raise (e.g. Task_Cancelled) to stop the run.
+                if callback: callback(entry, error)
+        except BaseException:
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        executor.shutdown()
+
+        for rel, *_ in plan.prune:
+            try:
+                os.remove(self.local_path(rel))
+                summary['pruned'] += 1
+            except OSError as error: summary['errors'].append((rel, str(error)))
+
+        return summary
+
+
+class Tree_Watcher:
+    # keeps a scanned Root_Directory live: inotifyd (or, without it, a 'find -newer' loop) runs in one long-lived shell, and only the folders it reports are relisted and merged with sync_folder.
+    mask = 'nmdywDM'
+    watch_chunk = 500
+    watch_limit = 8000
+    list_chunk = 200
+    settle = .3
+    poll_interval = 5
+    stamp = '/data/local/tmp/prmp_adb_watch'
+
+    def __init__(self, root, apply=True, lock=None, polling=None):
+        self.root = root
+        self.apply = apply
+        self.lock = lock or threading.RLock()
+        self.polling = polling
+        self.process = None
+        self.dirty = queue.Queue()
+        self.pending = queue.Queue()
+        self.overflowed = False
+        self.events = 0
+
+    @property
+    def running(self): return bool(self.process and self.process.poll() is None)
+
+    def folders(self): return [folder.path for folder in list(self.root.all_folders.values())]
+
+    def start(self, folders=None):
+        if self.running: return
+
+        folders = folders or self.folders()
+        with Command_Context(self.root.serial):
+            if self.polling is None: self.polling = len(folders) > self.watch_limit or not Shell.exec(['command', '-v', 'inotifyd'], 1).data.strip()
+            self.process = Shell._exec(['sh'], stdin=subprocess.PIPE)
+        if self.polling: self.send(self.poll_script())
+        else: self.watch(folders)
+
+        process = self.process
+        threading.Thread(target=self.read, args=(process,), daemon=True).start()
+        threading.Thread(target=self.work, args=(process,), daemon=True).start()
+
+    def stop(self):
+        if self.process:
+            # the watchers are background jobs of the device shell; killing adb alone would leave them running there.
+            self.send('kill $pids 2>/dev/null; exit\n')
+            try: self.process.wait(1)
+            except subprocess.TimeoutExpired: self.process.kill()
+            self.process = None
+
+    def send(self, script):
+        try:
+            self.process.stdin.write(script.encode())
+            self.process.stdin.flush()
+        except (OSError, AttributeError): ...
+
+    def watch(self, folders):
+        # inotify isn't recursive, so every folder gets a watch; new folders are added to the same shell as they appear.
+        lines = []
+        for index in range(0, len(folders), self.watch_chunk):
+            chunk = folders[index:index+self.watch_chunk]
+            lines.append('inotifyd - ' + ' '.join(shlex.quote(f'{folder}:{self.mask}') for folder in chunk) + ' & pids="$pids $!"\n')
+        self.send(''.join(lines))
+
+    def poll_script(self):
+        paths = ' '.join(shlex.quote(path) for path in self.root.get('load_paths') or [folder.path for folder in self.root.folder_s])
+        stamp = shlex.quote(self.stamp)
+        # -H: /sdcard is a symlink, and find doesn't descend into one named on the command line without it.
+        return f'touch {stamp}\nwhile true; do sleep {self.poll_interval}; touch {stamp}.new; find -H {paths} -newer {stamp} 2>/dev/null; mv {stamp}.new {stamp}; done & pids=$!\n'
+
+    def read(self, process):
+        for line in process.stdout:
+            line = line.decode('utf-8', 'replace').rstrip('\r\n')
+            if not line: continue
+            self.events += 1
+
+            if self.polling:
+                path = line.rstrip('/')
+                self.dirty.put(path if path.lower() in self.root.all_folders else posixpath.dirname(path))
+                continue
+
+            # 'EVENTS<tab>FOLDER[<tab>NAME]'
+            events, _, rest = line.partition('\t')
+            folder = rest.split('\t', 1)[0]
+            if 'o' in events: self.overflowed = True
+            if 'D' in events or 'M' in events: folder = posixpath.dirname(folder)
+            if folder: self.dirty.put(folder)
+
+    def restart(self, folders=None):
+        self.stop()
+        self.start(folders)
+
+    def work(self, process):
+        while self.process is process and process.poll() is None:
+            try: folders = {self.dirty.get(timeout=1)}
+            except queue.Empty: continue
+
+            # let a burst (a camera shot, an unzip) settle into one relisting.
+            deadline = time.time() + self.settle * 5
+            while time.time() < deadline:
+                try: folders.add(self.dirty.get(timeout=self.settle))
+                except queue.Empty: break
+
+            if self.overflowed:
+                # the kernel dropped events, so only a full rescan is trustworthy; it is fetched here and swapped in by apply_pending() on the tree's own thread, and the watches follow the new tree.
+                self.overflowed = False
+                try:
+                    with Command_Context(self.root.serial): fresh = self.root.fetch()
+                except Exception: continue
+                self.pending.put(('rescan', fresh))
+                if not self.polling: self.restart([folder.path for folder in fresh.all_folders.values()])
+            else:
+                try:
+                    with Command_Context(self.root.serial): self.pending.put(('sync', self.fetch(folders)))
+                except Exception: continue
+
+            if self.apply:
+                with self.lock: self.apply_pending()
+
+    def fetch(self, folders):
+        all_folders = self.root.all_folders
+        known = sorted(folder for folder in folders if folder.lower() in all_folders)
+        blocks = []
+
+        for index in range(0, len(known), self.list_chunk):
+            chunk = known[index:index+self.list_chunk]
+            listed = self.list(chunk)
+            blocks.extend(listed)
+
+            # a folder missing from the listing is gone; its parent's relisting removes it.
+            found = {path.lower() for path, entries in listed}
+            for folder in chunk:
+                if folder.lower() not in found: blocks.extend(self.list([posixpath.dirname(folder)]))
+
+        news = [f'{path}/{name}' for path, entries in blocks for name, size, is_folder in entries if is_folder and f'{path}/{name}'.lower() not in all_folders]
+        for folder in news:
+            listed = self.list([folder], recursive=True)
+            blocks.extend(listed)
+            if not self.polling: self.watch([path for path, entries in listed])
+
+        return blocks
+
+    def list(self, folders, recursive=False):
+        data, error = ExecOut.transport().exec(['ls', '-pRhs' if recursive else '-phs', *[shlex.quote(folder) for folder in folders]], 1).data_error
+        if error and not data: return []
+        return self.parse(data.decode('utf-8', 'replace'), folders[0] if len(folders) == 1 and not recursive else None)
+
+    @staticmethod
+    def parse(data, header=None):
+        # [(folder, [(name, size, is_folder), ...]), ...]; a single folder listed without -R has no 'path:' header.
+        blocks = [(header, [])] if header else []
+
+        for line in data.splitlines():
+            line = line.rstrip('\r')
+            if not line or line.startswith('total '): continue
+
+            if line.startswith('/') and line.endswith(':'):
+                if blocks == [(header, [])]: blocks.clear()
+                blocks.append((line[:-1], []))
+                continue
+
+            if not blocks: continue
+            size, _, name = line.lstrip(' ').partition(' ')
+            blocks[-1][1].append((name[:-1], size, True) if name.endswith('/') else (name, size, False))
+
+        return blocks
+
+    def apply_pending(self):
+        # merges whatever work() has fetched; returns the folders whose children changed, or None after a full rescan.
+        touched, rescanned = set(), False
+
+        while True:
+            try: kind, blocks = self.pending.get_nowait()
+            except queue.Empty: break
+
+            if kind == 'rescan':
+                self.root.swap(blocks)
+                touched, rescanned = set(), True
+                continue
+
+            for path, entries in blocks:
+                folder = self.root.sync_folder(path, entries)
+                if folder: touched.add(folder.path.lower())
+
+        return None if rescanned else touched
+
+
+class Task_Cancelled(Exception): ...
+
+
+class Task:
+    # a unit of work for Task_Scheduler; everything it reports goes into `events` and is handled by whoever drains that queue.
+    # the running task is also thread-local, so deep core loops report through Task.step() and adb processes started under it are killed by cancel().
+    local = threading.local()
+    report_interval = .1
+
+    def __init__(self, func, args=(), kwargs={}, events=None, done=None, error=None, progress=None, name='Task', pass_task=False, priority=None, cancelled=None):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.events = events if events is not None else queue.Queue()
+        self.done = done
+        self.error = error
+        self.on_progress = progress
+        self.on_cancel = cancelled
+        self.name = name
+        self.pass_task = pass_task
+        self.priority = priority
+        self.cancelled = False
+        self.finished = False
+        self.processes = []
+        self.reported = 0
+
+    def __repr__(self): return f'<Task({self.name})>'
+
+    @classmethod
+    def current(cls): return getattr(cls.local, 'task', None)
+
+    @classmethod
+    def step(cls, *info):
+        # a no-op outside a task; raises Task_Cancelled once cancelled, and passes `info` on as progress at most every report_interval.
+        task = cls.current()
+        if not task: return
+
+        task.check()
+        now = time.time()
+        if info and task.on_progress and now - task.reported >= cls.report_interval:
+            task.reported = now
+            task.progress(*info)
+
+    @classmethod
+    def started(cls, process):
+        task = cls.current()
+        if task:
+            task.processes = [running for running in task.processes if running.poll() is None]
+            task.processes.append(process)
+
+    def cancel(self):
+        self.cancelled = True
+        for process in self.processes:
+            try: process.kill()
+            except OSError: ...
+
+    def check(self):
+        if self.cancelled: raise Task_Cancelled(self.name)
+
+    def progress(self, *info):
+        self.check()
+        self.events.put((self, 'progress', info))
+
+    def run(self):
+        Task.local.task = self
+        try:
+            self.check()
+            with Command_Context(priority=self.priority): result = self.func(self, *self.args, **self.kwargs) if self.pass_task else self.func(*self.args, **self.kwargs)
+            self.check()
+            event = 'done', result
+        except Task_Cancelled as error: event = 'cancelled', error
+        except Exception as error: event = ('cancelled', Task_Cancelled(self.name)) if self.cancelled else ('error', error)
+        finally: Task.local.task = None
+
+        self.finished = True
+        self.events.put((self, *event))
+
+
+class Task_Scheduler:
+    def __init__(self, workers=4):
+        self.queue = queue.Queue()
+        for _ in range(workers): threading.Thread(target=self.work, daemon=True).start()
+
+    def submit(self, task):
+        self.queue.put(task)
+        return task
+
+    def work(self):
+        while True: self.queue.get().run()
+
+    @staticmethod
+    def drain(events, limit=200):
+        for _ in range(limit):
+            try: yield events.get_nowait()
+            except queue.Empty: return
+
+
+THUMBNAIL_EXTS = ['jpg', 'jpeg', 'png', 'mp4']
+
+
+class Thumbnail_Cache:
+    # LRU of decoded thumbnails in memory, backed by a size-bounded LRU folder of png files on disk.
+
+    def __init__(self, folder=DEFAULT_THUMBNAILS, max_bytes=64 * 1024**2, memory_items=2000):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self.memory = collections.OrderedDict()
+        self.disk = collections.OrderedDict()
+        self.disk_bytes = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(folder, exist_ok=True)
+        entries = []
+        with os.scandir(folder) as it:
+            for entry in it:
+                if entry.name.endswith('.png'):
+                    stat = entry.stat()
+                    entries.append((stat.st_atime, entry.name[:-4], stat.st_size))
+
+        for atime, name, size in sorted(entries):
+            self.disk[name] = size
+            self.disk_bytes += size
+
+    @staticmethod
+    def key(obj): return hashlib.sha1(f"{obj.path}|{int(obj.full_size)}|{int(getattr(obj, 'mtime', 0) or 0)}".encode()).hexdigest()
+
+    def disk_path(self, key): return os.path.join(self.folder, f'{key}.png')
+
+    def get(self, key):
+        with self.lock:
+            image = self.memory.get(key)
+            if image is not None: self.memory.move_to_end(key)
+            return image
+
+    def has(self, key):
+        with self.lock: return key in self.memory
+
+    def load(self, key):
+        # worker side: disk -> memory.
+        with self.lock:
+            if key not in self.disk: return
+            self.disk.move_to_end(key)
+
+        path = self.disk_path(key)
+        try:
+            image = PIL_Image.open(path)
+            image.load()
+            os.utime(path)
+        except OSError:
+            with self.lock: self.disk_bytes -= self.disk.pop(key, 0)
+            return
+
+        self.put_memory(key, image)
+        return image
+
+    def put_memory(self, key, image):
+        with self.lock:
+            self.memory[key] = image
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_items: self.memory.popitem(last=False)
+
+    def put(self, key, image):
+        self.put_memory(key, image)
+
+        path = self.disk_path(key)
+        image.save(path, 'PNG')
+        size = os.path.getsize(path)
+
+        with self.lock:
+            self.disk_bytes += size - self.disk.get(key, 0)
+            self.disk[key] = size
+            self.disk.move_to_end(key)
+
+            while self.disk_bytes > self.max_bytes and len(self.disk) > 1:
+                old, old_size = self.disk.popitem(last=False)
+                self.disk_bytes -= old_size
+                try: os.remove(self.disk_path(old))
+                except OSError: ...
+
+
+class Thumbnailer:
+    # fetches and decodes thumbnails on worker threads; callers only ever read the memory cache, so nothing here blocks the Tk thread.
+    max_full_read = 4 * 1024**2
+    head_read = 64 * 1024
+    # seconds a failed key is left alone; the device may have been busy, offline or still writing the file.
+    retry_after = 60
+
+    def __init__(self, cache=None, workers=2, size=image_size):
+        self.cache = cache or Thumbnail_Cache()
+        self.size = size
+        self.queue = queue.PriorityQueue()
+        self.queued = set()
+        self.failed = {}
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+        for _ in range(workers): threading.Thread(target=self.work, daemon=True).start()
+
+    @staticmethod
+    def wants(obj): return obj.file and obj.ext.lower() in THUMBNAIL_EXTS
+
+    def get(self, obj): return self.cache.get(Thumbnail_Cache.key(obj))
+
+    def request(self, obj, priority=1, serial=None):
+        key = Thumbnail_Cache.key(obj)
+        with self.lock:
+            if key in self.queued or self.cache.has(key): return key
+            if time.time() - self.failed.get(key, 0) < self.retry_after: return key
+            self.failed.pop(key, None)
+            self.queued.add(key)
+        # newer requests of the same priority first, they are what is on screen.
+        self.queue.put((priority, -next(self.counter), key, obj, serial))
+        return key
+
+    def work(self):
+        while True:
+            priority, _, key, obj, serial = self.queue.get()
+            try:
+                image = self.cache.load(key)
+                # what is on screen is interactive, prefetching the next pages is not.
+                if image is None:
+                    with Command_Context(serial, INTERACTIVE if priority == 0 else NORMAL): image = self.make(key, obj)
+            except Exception: image = None
+
+            with self.lock:
+                self.queued.discard(key)
+                if image is None: self.failed[key] = time.time()
+
+    def make(self, key, obj):
+        data = self.fetch(obj)
+        if not data: return
+
+        image = PIL_Image.open(io.BytesIO(data))
+        image.draft('RGB', (self.size[0] * 2, self.size[1] * 2))
+        image = image.convert('RGBA')
+        image.thumbnail(self.size)
+
+        self.cache.put(key, image)
+        return image
+
+    def read(self, args): return ExecOut.exec(args, 1).data
+
+    def fetch(self, obj):
+        # a pty would corrupt the image bytes, so without exec-out there are no thumbnails.
+        if not ExecOut.is_supported(): return
+
+        ext, path = obj.ext.lower(), shlex.quote(obj.path)
+
+        if ext in ('jpg', 'jpeg'):
+            head = self.read(['dd', f'if={path}', f'bs={self.head_read}', 'count=1', '2>/dev/null'])
+            thumb = self.exif_thumbnail(head)
+            if thumb: return thumb
+            if obj.full_size <= self.head_read: return head
+
+        elif ext == 'mp4': return self.media_store_thumbnail(obj)
+
+        if obj.full_size <= self.max_full_read: return self.read(['cat', path])
+
+    @staticmethod
+    def exif_thumbnail(data):
+        start = data.find(b'\xff\xd8\xff', 2)
+        if start < 0: return
+        end = data.find(b'\xff\xd9', start)
+        if end > start: return data[start:end+2]
+
+    def media_store_thumbnail(self, obj):
+        # an argv list, so the quoting reaches the device shell: a string would be split (and unquoted) on the host first.
+        where = shlex.quote("_data='%s'" % obj.path.replace("'", "''"))
+        data = Shell.exec(['content', 'query', '--uri', 'content://media/external/video/media', '--projection', '_id', '--where', where], 1).data.decode(errors='replace')
+        if '_id=' not in data: return
+
+        _id = data.split('_id=', 1)[1].split()[0].strip(',')
+        if not _id.isdigit(): return
+        data = Shell.exec(['content', 'query', '--uri', 'content://media/external/video/thumbnails', '--projection', '_data', '--where', f'video_id={_id}'], 1).data.decode(errors='replace')
+        if '_data=' not in data: return
+
+        return self.read(['cat', shlex.quote(data.split('_data=', 1)[1].strip())])
+
+
+LOG_PRIORITIES = 'VDIWEF'
+LOG_PRIORITY = {level: index for index, level in enumerate(LOG_PRIORITIES)}
+
+
+class Log_Record(collections.namedtuple('Log_Record', 'time pid tid priority tag message')):
+    # a plain tuple underneath, so a full ring of them costs no more than the strings they hold.
+    __slots__ = ()
+    subs = []
+
+    @property
+    def level(self): return LOG_PRIORITIES[self.priority]
+
+    def __str__(self): return f'{self.time} {self.pid:5} {self.tid:5} {self.level} {self.tag:8}: {self.message}'
+
+
+class Ring_Buffer:
+    # fixed capacity with O(1) append and indexing; once full each append overwrites the oldest item.
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.clear()
+
+    def clear(self):
+        self.items = [None] * self.capacity
+        self.start = 0
+        self.count = 0
+
+    def __len__(self): return self.count
+
+    def __getitem__(self, index):
+        if index < 0: index += self.count
+        if not 0 <= index < self.count: raise IndexError(index)
+        return self.items[(self.start + index) % self.capacity]
+
+    def __iter__(self):
+        for index in range(self.count): yield self.items[(self.start + index) % self.capacity]
+
+    def append(self, item):
+        if self.count < self.capacity:
+            self.items[(self.start + self.count) % self.capacity] = item
+            self.count += 1
+        else:
+            self.items[self.start] = item
+            self.start = (self.start + 1) % self.capacity
+
+    def popleft(self):
+        if not self.count: raise IndexError('pop from an empty Ring_Buffer')
+        item, self.items[self.start] = self.items[self.start], None
+        self.start = (self.start + 1) % self.capacity
+        self.count -= 1
+        return item
+
+
+class Log_Filter:
+    def __init__(self, tags=(), priority=0, pids=(), pattern=''):
+        self.tags = set(tags)
+        self.priority = priority
+        self.pids = {int(pid) for pid in pids}
+        self.regex = re.compile(pattern) if pattern else None
+
+    @property
+    def active(self): return bool(self.tags or self.priority or self.pids or self.regex)
+
+    def __call__(self, record):
+        if record.priority < self.priority: return False
+        if self.tags and record.tag not in self.tags: return False
+        if self.pids and record.pid not in self.pids: return False
+        if self.regex and not (self.regex.search(record.message) or self.regex.search(record.tag)): return False
+        return True
+
+
+class Log_Buffer:
+    # the last `capacity` records, plus the sequence numbers of those passing `filter`; new records are filtered as they arrive, so only set_filter walks the ring.
+
+    def __init__(self, capacity=100000, filter=None):
+        self.records = Ring_Buffer(capacity)
+        self.matches = Ring_Buffer(capacity)
+        self.filter = filter or Log_Filter()
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def __len__(self): return len(self.matches)
+
+    @property
+    def first(self): return self.total - len(self.records)
+
+    @property
+    def dropped(self): return self.first
+
+    def extend(self, records):
+        filter = self.filter if self.filter.active else None
+
+        with self.lock:
+            for record in records:
+                self.records.append(record)
+                if not filter or filter(record): self.matches.append(self.total)
+                self.total += 1
+
+            first, matches = self.first, self.matches
+            while matches and matches[0] < first: matches.popleft()
+
+    def set_filter(self, filter):
+        with self.lock:
+            self.filter = filter
+            self.matches.clear()
+            first = self.first
+            for index, record in enumerate(self.records):
+                if filter(record): self.matches.append(first + index)
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+            self.matches.clear()
+            self.total = 0
+
+    def rows(self, start, stop):
+        with self.lock:
+            first, matches, records = self.first, self.matches, self.records
+            return [records[matches[index] - first] for index in range(max(start, 0), min(stop, len(matches)))]
+
+    def export(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            for record in self.rows(0, len(self)): file.write(f'{record}\n')
+
+
+class Logcat:
+    # one long-running 'adb logcat'; a reader thread parses its output in chunks into `buffer`. Binary (-B) needs exec-out, a pty would mangle it.
+    chunk = 256 * 1024
+    binary_header = struct.Struct('<HH')
+    binary_entry = struct.Struct('<iIII')
+
+    def __init__(self, buffer=None, binary=None, args=(), serial=None):
+        self.buffer = buffer if buffer is not None else Log_Buffer()
+        self.serial = serial
+        # None: probed by the first start(), which runs off the Tk thread.
+        self.binary = binary
+        self.args = list(args)
+        self.process = None
+        self.started = 0
+        self.stamps = {}
+
+    @property
+    def running(self): return bool(self.process and self.process.poll() is None)
+
+    @property
+    def rate(self):
+        elapsed = time.time() - self.started
+        return self.buffer.total / elapsed if self.started and elapsed else 0
+
+    def start(self):
+        if self.running: return
+        # a long-lived stream, so it takes no scheduler slot.
+        with Command_Context(self.serial):
+            if self.binary is None: self.binary = ExecOut.is_supported()
+            if self.binary: self.process = ExecOut._exec(['logcat', '-B', *self.args])
+            else: self.process = ADB._exec(['logcat', '-v', 'threadtime', *self.args])
+
+        self.started = time.time()
+        threading.Thread(target=self.read, args=(self.process,), daemon=True).start()
+
+    def stop(self):
+        if self.process:
+            self.process.kill()
+            self.process = None
+
+    def read(self, process):
+        parse = self.parse_binary if self.binary else self.parse_text
+        rest = b''
+
+        for data in iter(lambda: process.stdout.read1(self.chunk), b''):
+            records, rest = parse(rest + data)
+            if records: self.buffer.extend(records)
+
+    @staticmethod
+    def parse_text(data):
+        end = data.rfind(b'\n') + 1
+        records = []
+
+        for line in data[:end].decode('utf-8', 'replace').splitlines():
+            parts = line.split(None, 5)
+            # skips the '--------- beginning of main' banners and anything else that isn't threadtime.
+            if len(parts) < 6 or parts[4] not in LOG_PRIORITY: continue
+
+            date, clock, pid, tid, level, text = parts
+            tag, separator, message = text.partition(': ')
+            if not separator: tag, _, message = text.partition(':')
+            try: records.append(Log_Record(f'{date} {clock}', int(pid), int(tid), LOG_PRIORITY[level], tag.rstrip(), message))
+            except ValueError: ...
+
+        return records, data[end:]
+
+    def stamp(self, seconds, nanoseconds):
+        prefix = self.stamps.get(seconds)
+        if prefix is None:
+            if len(self.stamps) > 1024: self.stamps.clear()
+            prefix = self.stamps[seconds] = time.strftime('%m-%d %H:%M:%S', time.localtime(seconds))
+        return f'{prefix}.{nanoseconds // 1000000:03}'
+
+    def parse_binary(self, data):
+        # logger_entry: payload length, header size (0 on v1 = 20 bytes), pid, tid, sec, nsec, ...; payload is priority byte, tag\0, message\0.
+        records, offset, size = [], 0, len(data)
+
+        while size - offset >= 4:
+            length, header = self.binary_header.unpack_from(data, offset)
+            start = offset + (header or 20)
+            end = start + length
+            if end > size: break
+
+            pid, tid, seconds, nanoseconds = self.binary_entry.unpack_from(data, offset + 4)
+            tag_end = data.find(b'\0', start + 1, end)
+            if tag_end < 0: tag_end = end
+
+            priority = min(max(data[start] - 2, 0), 5) if length else 0
+            tag = data[start+1:tag_end].decode('utf-8', 'replace')
+            message = data[tag_end+1:end].rstrip(b'\0').decode('utf-8', 'replace')
+
+            records.append(Log_Record(self.stamp(seconds, nanoseconds), pid, tid, priority, tag, message))
+            offset = end
+
+        return records, data[offset:]
+
+
+class Latest_Slot:
+    # holds only the newest item; putting over one nobody took counts as a dropped frame.
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.item = None
+        self.fresh = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self.condition:
+            if self.fresh: self.dropped += 1
+            self.item, self.fresh = item, True
+            self.condition.notify()
+
+    def take(self, timeout=None):
+        with self.condition:
+            if not self.fresh and timeout != 0: self.condition.wait(timeout)
+            if not self.fresh: return
+
+            self.fresh = False
+            return self.item
+
+
+class Rate_Meter:
+    # events per second over the last `window` seconds.
+
+    def __init__(self, window=2):
+        self.window = window
+        self.times = collections.deque()
+
+    def tick(self):
+        now = time.time()
+        self.times.append(now)
+        while now - self.times[0] > self.window: self.times.popleft()
+
+    @property
+    def rate(self):
+        times = list(self.times)
+        if len(times) < 2 or time.time() - times[-1] > self.window: return 0
+        return (len(times) - 1) / ((times[-1] - times[0]) or 1)
+
+
+class Screen_Stream:
+    # mirrors a device screen over one persistent exec-out pipe. 'h264' decodes screenrecord's stream with PyAV; 'raw' loops screencap on the device and reads the uncompressed frames back to back.
+    # frames are decoded on their own thread, and only the newest captured and the newest decoded frame are ever kept.
+    raw_formats = {1: ('RGBA', 'RGBA', 4), 2: ('RGB', 'RGBX', 4), 3: ('RGB', 'RGB', 3), 4: ('RGB', 'BGR;16', 2)}
+    raw_header = struct.Struct('<III')
+    chunk = 64 * 1024
+    bit_rate = 4000000
+    # screenrecord gives nothing on older Android or a secure display, and the device loop would just keep restarting it.
+    first_frame_timeout = 5
+
+    def __init__(self, serial=None, mode=None, size=None):
+        self.serial = serial
+        self.mode = mode
+        self.size = size
+        self.process = None
+        self.running = False
+        self.header = 12
+        self.width = self.height = 0
+        self.latency = 0
+        self.error = None
+        self.notice = ''
+        self.frames = 0
+
+        self.captured = Latest_Slot()
+        self.decoded = Latest_Slot()
+        self.capture_rate = Rate_Meter()
+        self.show_rate = Rate_Meter()
+
+    def start(self):
+        if self.running: return
+        if not _PIL_: raise ADB_Error('Screen streaming needs Pillow to decode frames.')
+
+        # a long-lived stream, so like Logcat it takes no scheduler slot.
+        with Command_Context(self.serial):
+            if not ExecOut.is_supported(): raise ADB_Error('Screen streaming needs adb exec-out, a pty would mangle the frames.')
+
+            if not self.mode: self.mode = 'h264' if _AV_ and ExecOut.exec('command -v screenrecord', 1).data.strip() else 'raw'
+            # before the readers start, they stop once it's off.
+            self.running = True
+            if self.mode == 'h264':
+                # screenrecord stops after its time limit, so the loop starts the next one on the same pipe. exec-out carries stderr in the same stream, so it goes.
+                process = self.process = ExecOut._exec(['sh', '-c', shlex.quote(f'while :; do screenrecord --output-format=h264 --bit-rate {self.bit_rate} - 2>/dev/null; done')])
+                threading.Thread(target=self.read_h264, args=(process,), daemon=True).start()
+                threading.Thread(target=self.fall_back, args=(process,), daemon=True).start()
+            else:
+                try: self.start_raw()
+                except:
+                    self.running = False
+                    raise
+
+        threading.Thread(target=self.decode, daemon=True).start()
+
+    def start_raw(self):
+        # exec-out has no stdin, so the loop runs on the device; the pipe's backpressure paces it to what is read here.
+        self.probe()
+        self.mode = 'raw'
+        process = self.process = ExecOut._exec(['sh', '-c', shlex.quote('while :; do screencap 2>/dev/null; done')])
+        threading.Thread(target=self.read_raw, args=(process,), daemon=True).start()
+
+    def fall_back(self, process):
+        deadline = time.time() + self.first_frame_timeout
+        while time.time() < deadline and self.process is process and not self.frames: time.sleep(.1)
+        if self.process is not process or self.frames: return
+
+        # detached first, so its reader ends without taking the stream down.
+        self.process = None
+        process.kill()
+        try:
+            with Command_Context(self.serial): self.start_raw()
+            # stopped while it was switching over.
+            if not self.running: return self.stop()
+            self.notice = f'screenrecord gave no frame in {self.first_frame_timeout}s, showing raw screencaps instead.'
+        except Exception as error:
+            self.error = error
+            self.running = False
+
+    def stop(self):
+        self.running = False
+        if self.process:
+            self.process.kill()
+            self.process = None
+
+    def probe(self):
+        # the raw header is width, height, format, plus a colour space word since Android 12; one frame tells which.
+        started = time.time()
+        data = ExecOut.exec('screencap 2>/dev/null', 1).data
+        if len(data) < self.raw_header.size: raise ADB_Error('screencap returned no frame.')
+
+        width, height, format = self.raw_header.unpack_from(data)
+        if format not in self.raw_formats: raise ADB_Error(f'Unsupported screencap pixel format {format}.')
+
+        self.header = len(data) - width * height * self.raw_formats[format][2]
+        if self.header not in (12, 16): raise ADB_Error(f'Unexpected screencap header of {self.header} bytes.')
+        self.captured.put((data, started))
+
+    def read_raw(self, process):
+        # frames come back to back with no framing but their own headers, so each header says how many pixel bytes to read. Latency is counted from the arrival of the frame's header.
+        stdout = process.stdout
+        try:
+            while self.running:
+                header = stdout.read(self.header)
+                if len(header) < self.header: break
+                received = time.time()
+
+                width, height, format = self.raw_header.unpack_from(header)
+                if format not in self.raw_formats: raise ADB_Error(f'Unsupported screencap pixel format {format}.')
+
+                size = width * height * self.raw_formats[format][2]
+                pixels = stdout.read(size)
+                if len(pixels) < size: break
+
+                self.frames += 1
+                self.capture_rate.tick()
+                self.captured.put((header + pixels, received))
+        except (OSError, ValueError, ADB_Error) as error:
+            if self.running and process is self.process: self.error = error
+        # a stream replaced by fall_back() ends without stopping its successor.
+        if process is self.process: self.running = False
+
+    def read_h264(self, process):
+        # every packet has to go through the decoder, so only the decoded frames can be dropped. Latency is counted from the arrival of the chunk that completed the frame.
+        codec = av.CodecContext.create('h264', 'r')
+        try:
+            for data in iter(lambda: process.stdout.read1(self.chunk), b''):
+                received = time.time()
+                for packet in codec.parse(data):
+                    for frame in codec.decode(packet):
+                        self.frames += 1
+                        self.capture_rate.tick()
+                        self.captured.put((frame, received))
+        except Exception as error:
+            if self.running and process is self.process: self.error = error
+        if process is self.process: self.running = False
+
+    def fit(self, width, height):
+        if not self.size: return width, height
+        scale = min(self.size[0] / width, self.size[1] / height, 1)
+        return max(int(width * scale), 1), max(int(height * scale), 1)
+
+    def to_image(self, frame):
+        if isinstance(frame, bytes):
+            width, height, format = self.raw_header.unpack_from(frame)
+            mode, rawmode, _ = self.raw_formats[format]
+            image = PIL_Image.frombuffer(mode, (width, height), memoryview(frame)[self.header:], 'raw', rawmode, 0, 1)
+            size = self.fit(width, height)
+            if size != image.size: image = image.resize(size, PIL_Image.BILINEAR, reducing_gap=2)
+        else:
+            width, height = frame.width, frame.height
+            size = self.fit(width, height)
+            # swscale does the scaling and conversion in one pass.
+            image = frame.to_image(width=size[0], height=size[1])
+
+        self.width, self.height = width, height
+        return image
+
+    def decode(self):
+        while self.running:
+            item = self.captured.take(.5)
+            if item is None: continue
+
+            frame, captured = item
+            try: self.decoded.put((self.to_image(frame), captured))
+            except Exception as error: self.error = error
+
+    def latest(self):
+        # the newest decoded frame, or None when nothing new arrived since the last call.
+        item = self.decoded.take(0)
+        if item is None: return
+
+        image, captured = item
+        latency = time.time() - captured
+        self.latency = latency if not self.latency else self.latency * .8 + latency * .2
+        self.show_rate.tick()
+        return image
+
+    def stats(self): return dict(notice=self.notice, mode=self.mode, width=self.width, height=self.height, capture_fps=self.capture_rate.rate, shown_fps=self.show_rate.rate, latency=self.latency, dropped=self.captured.dropped + self.decoded.dropped)
+
+
+class Package:
+    subs = []
+
+    def __init__(self, name, path='', version_code=0):
+        self.name = name
+        self.path = path
+        self.version_code = version_code
+        self.version = ''
+        self.updated = ''
+        self.full_size = 0
+
+    def __repr__(self): return f'<Package({self.name}, {self.version or self.version_code})>'
+
+    def __str__(self): return self.name
+
+    @property
+    def size(self): return Base.format_size(self, self.full_size)
+
+    def info(self): return dict(package=self.name, version=self.version, version_code=self.version_code, path=self.path, size=self.full_size, updated=self.updated)
+
+
+class Package_Inventory:
+    # a device's installed packages, kept with the Device in the db; refresh() lists them in one 'pm list packages' and only asks dumpsys and stat about new or changed ones.
+    details_chunk = 40
+
+    def __init__(self, serial):
+        self.serial = serial
+        self.packages = {}
+        self.refreshed = 0
+
+    def __len__(self): return len(self.packages)
+
+    def __iter__(self): return iter(self.packages.values())
+
+    def get(self, name): return self.packages.get(name)
+
+    def run(self, script): return ExecOut.transport().exec(['sh', '-c', shlex.quote(script)], 1).data.decode('utf-8', 'replace')
+
+    def listing(self):
+        # {package: (path, versionCode)}; --show-versioncode is Android 9+, older pm only gives paths.
+        listed = {}
+        for flags in ('-f --show-versioncode', '-f'):
+            for line in self.run(f'pm list packages {flags}').splitlines():
+                if not line.startswith('package:'): continue
+
+                line, _, code = line[8:].strip().partition(' versionCode:')
+                path, _, name = line.rpartition('=')
+                listed[name] = path, int(code) if code.isdigit() else 0
+
+            if listed: break
+        return listed
+
+    def refresh(self):
+        with Command_Context(self.serial):
+            listed = self.listing()
+            if not listed: raise ADB_Error(f'{self.serial}: pm listed no packages.')
+
+            changed = []
+            for name, (path, code) in listed.items():
+                package = self.packages.get(name)
+                # before Android 9 the listed code is always 0, so the path (a new one per install) is all there is to compare; the dumpsys code stays.
+                if package and package.path == path and (not code or package.version_code == code): continue
+
+                package = self.packages[name] = Package(name, path, code)
+                changed.append(package)
+
+            removed = [name for name in self.packages if name not in listed]
+            for name in removed: del self.packages[name]
+
+            for start in range(0, len(changed), self.details_chunk): self.details(changed[start:start+self.details_chunk])
+
+        self.refreshed = time.time()
+        return dict(serial=self.serial, packages=len(self.packages), changed=len(changed), removed=len(removed))
+
+    def details(self, packages):
+        names = ' '.join(shlex.quote(package.name) for package in packages)
+        data = self.run(f"for p in {names}; do echo \"package:$p\"; dumpsys package \"$p\" | grep -m3 -E 'versionCode=|versionName=|lastUpdateTime='; done")
+
+        package = None
+        for line in data.splitlines():
+            line = line.strip()
+            if line.startswith('package:'): package = self.packages.get(line[8:])
+            elif not package: continue
+            elif line.startswith('versionName='): package.version = line[12:]
+            elif line.startswith('lastUpdateTime='): package.updated = line[15:]
+            elif line.startswith('versionCode=') and not package.version_code:
+                code = line[12:].split(' ', 1)[0]
+                if code.isdigit(): package.version_code = int(code)
+
+        paths = {package.path: package for package in packages if package.path}
+        data = self.run('stat -c "%s %n" ' + ' '.join(shlex.quote(path) for path in paths) + ' 2>/dev/null')
+        for line in data.splitlines():
+            size, _, path = line.partition(' ')
+            if path in paths and size.isdigit(): paths[path].full_size = int(size)
+
+
+class Fleet_Result:
+    def __init__(self, serial, action, target, ok, output='', elapsed=0):
+        self.serial = serial
+        self.action = action
+        self.target = target
+        self.ok = ok
+        self.output = output
+        self.elapsed = elapsed
+
+    def __repr__(self): return f'<Fleet_Result({self.serial}, {self.action} {self.target}, {"ok" if self.ok else "failed"})>'
+
+    def info(self): return dict(serial=self.serial, action=self.action, target=self.target, ok=self.ok, output=self.output, elapsed=self.elapsed)
+
+
+class Fleet:
+    # runs package operations on many devices at once; `workers` bounds the devices in flight and each device's commands still queue in ADB.scheduler as bulk work.
+
+    def __init__(self, serials=None, workers=8):
+        if serials is None: serials = [device.unique for device in Devices.create_devices(1) or []]
+        self.serials = list(serials)
+        self.workers = workers
+
+    def run(self, job):
+        # yields a device's results as soon as it finishes.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(self.serials)))) as executor:
+            futures = [executor.submit(self._run, job, serial) for serial in self.serials]
+            for future in concurrent.futures.as_completed(futures): yield from future.result()
+
+    def _run(self, job, serial):
+        with Command_Context(serial, BULK): return list(job(serial))
+
+    @staticmethod
+    def _result(serial, action, target, process, start):
+        output = (process.data + process.error).decode('utf-8', 'replace').strip()
+        return Fleet_Result(serial, action, target, 'Success' in output and 'Failure' not in output, output, time.time() - start)
+
+    def install(self, apks, replace=True, downgrade=False, grant=False, refresh=True):
+        # apks: one path, or a list whose items are a path or a list of split APK paths for 'install-multiple'.
+        if isinstance(apks, str): apks = [apks]
+        flags = ['-r'] * replace + ['-d'] * downgrade + ['-g'] * grant
+
+        def job(serial):
+            for apk in apks:
+                start = time.time()
+                if isinstance(apk, str): yield self._result(serial, 'install', apk, ADB.exec(['install', *flags, apk], 1), start)
+                else: yield self._result(serial, 'install-multiple', ' '.join(apk), ADB.exec(['install-multiple', *flags, *apk], 1), start)
+            if refresh: self.refresh_inventory(serial)
+
+        return self.run(job)
+
+    def uninstall(self, packages, keep_data=False, refresh=True):
+        if isinstance(packages, str): packages = [packages]
+
+        def job(serial):
+            for package in packages:
+                start = time.time()
+                yield self._result(serial, 'uninstall', package, ADB.exec(['uninstall', *['-k'] * keep_data, package], 1), start)
+            if refresh: self.refresh_inventory(serial)
+
+        return self.run(job)
+
+    def inventories(self):
+        def job(serial): yield Device_Packages.inventory(serial).refresh()
+        return self.run(job)
+
+    @staticmethod
+    def refresh_inventory(serial):
+        inventory = Device_Packages.inventory(serial, create=False)
+        if inventory:
+            try: inventory.refresh()
+            except ADB_Error: ...
+
+
+class Device_Packages:
+    # inventories live on the scanned Device so they are saved with it; devices that were never scanned keep theirs here for the session.
+    inventories = {}
+
+    @classmethod
+    def inventory(cls, serial, create=True):
+        device = Devices.devices.get(serial)
+        inventory = device.get('packages') if device else cls.inventories.get(serial)
+
+        if inventory is None and create:
+            inventory = Package_Inventory(serial)
+            if device: device.packages = inventory
+            else: cls.inventories[serial] = inventory
+        return inventory
+
+
+class FileSystem:
+    def __str__(self): return self.mounted_on
+    def __repr__(self): return f'<{self.name}>'
+    
+    @property
+    def subs(self): return []
+    @property
+    def name(self): return f'FileSystem({self.mounted_on})'
+
+    def __init__(self, data, type=1):
+        self.type = type
+        if self.type == 1: self.path, self.total, self.used, self.available, self.percentage_use, self.mounted_on = data.split()
+        
+        elif self.type == 2: self.path, self.total, self.used, self.available = data.split()
+
+
+        self.used = Base.float_size(self, self.used)
+        self.available = Base.float_size(self, self.available)
+        self.total = Base.float_size(self, self.total)
+
+    @property
+    def used_size(self): return Base.format_size(self, self.used)
+    @property
+    def available_size(self): return Base.format_size(self, self.available)
+    @property
+    def total_size(self): return Base.format_size(self, self.total)
+
+
+class Device:
+    def get(self, name, default=None): return getattr(self, name, default)
+    
+    def _split(self, data): return data.split(':')[1]
+    def _splits(self, *datas): return [self._split(data) for data in datas]
+
+    def _split2(self, data): return data.split(': [')[1][:-1]
+    def _splits2(self, *datas): return [self._split2(data) for data in datas]
+    subs = []
+    # every snapshot is pickled into the db with the device, and a diff only needs the last two.
+    max_snapshots = 2
+
+    def __init__(self, data, dummy=False):
+        self.dummy = dummy
+        self.root_directory = None
+
+        self.unique, _, self.product, self.model, self.name, self.transport_id = data.split()
+
+        self.product, self.name, self.model, self.transport_id = self._splits(self.product, self.name, self.model, self.transport_id)
+        
+        self.brand = self.manufacturer = ''
+        self.filesystems = []
+        self.snapshots = []
+
+        self.load()
+    
+    def load(self):
+        if not self.dummy:
+            with Command_Context(serial=self.unique):
+                Task.step('connecting', self.name)
+                ADB.exec('root')
+                self.getprop()
+                self.df()
+                self.root_directory = Root_Directory(self)
+            self.take_snapshot()
+
+    def __getstate__(self):
+        # dbs saved before max_snapshots was lowered still carry more.
+        state = self.__dict__.copy()
+        if state.get('snapshots'): state['snapshots'] = state['snapshots'][-self.max_snapshots:]
+        return state
+
+    def take_snapshot(self, snapshot=None):
+        snapshots = self.get('snapshots')
+        if snapshots is None: snapshots = self.snapshots = []
+
+        snapshot = snapshot or Snapshot(self.root_directory)
+        snapshots.append(snapshot)
+        del snapshots[:-self.max_snapshots]
+        return snapshot
+
+    @property
+    def mapped_path(self): return f'{self.unique}{MAPPED_EXT}'
+
+    def save_mapped(self):
+        if self.root_directory: Mapped_Tree.write(self.root_directory, self.mapped_path)
+
+    def mapped_fresh(self):
+        # at least as new as the last scan and the last live update.
+        path = self.mapped_path
+        snapshots = self.get('snapshots')
+        root = self.root_directory
+        newest = max(snapshots[-1].time if snapshots else 0, root.get('updated', 0) if root else 0)
+        return os.path.exists(path) and os.path.getmtime(path) >= newest
+
+    def mapped_tree(self):
+        if self.mapped_fresh(): return Mapped_Tree(self.mapped_path)
+
+    def screencap(self):
+        with Command_Context(serial=self.unique): return self._screencap()
+
+    def _screencap(self):
+        if ExecOut.is_supported(): return ExecOut.exec('screencap -p', 1).data
+
+        # a pty would mangle the png, so go through a file on the device instead.
+        path = '/data/local/tmp/prmp_adb_screen.png'
+        Shell.exec(['screencap', '-p', path], 1)
+        data = Shell.exec(['base64', path], 1).data
+        Shell.exec(['rm', '-f', path], 1)
+        return base64.b64decode(data)
+
+    def getprop(self):
+        process = Shell.exec('getprop')
+        data = process.data.decode()
+        for line in data.splitlines():
+            if 'ro.product.brand' in line: self.brand = self._split2(line)
+            elif 'ro.product.manufacturer' in line: self.manufacturer = self._split2(line)
+
+    def df(self):
+        process = Shell.exec('df')
+        data = process.data.decode()
+        header, *datas = data.splitlines()
+        header = header.split()
+        
+        if header == 'Filesystem                                                     1K-blocks    Used Available Use% Mounted on'.split(): type = 1
+        elif header == 'Filesystem               Size     Used     Free   Blksize'.split(): type = 2
+        
+        for data in datas:
+            if data and 'Permission denied' not in data:
+                filesystem = FileSystem(data, type)
+                self.filesystems.append(filesystem)
+    
+    def __str__(self): return f'Device{self.name, self.unique}'
+    def __repr__(self): return f'{self}>'
+
+
+class Devices:
+    devices = {}
+    
+    @classmethod
+    def list(cls): return list(cls.devices.values())
+
+    @classmethod
+    def add_device(cls, device):
+        if device.dummy:
+            device.dummy = False
+            device.load()
+        Devices.devices[device.unique] = device
+
+    @classmethod
+    def create_devices(cls, dummy=False):
+        process = ADB.exec('devices -l')
+        data = process.data.decode()
+        data = data.strip()
+        _, *datas = data.splitlines()
+        dummies = []
+
+        if len(datas) == 0: raise ADB_Error('No device is connected')
+        
+        for data in datas:
+            if 'unauthorized' in data: raise ADB_Error('''This adb server's $ADB_VENDOR_KEYS is not set
+Try 'adb kill-server' if that seems wrong.
+Otherwise check for a confirmation dialog on your device.
+List of devices attached''')
+            elif 'offline' in data: raise ADB_Error('Device is cuurently offline, please detach and reattach the USB cable on the device.')
+            
+            else:
+                device = Device(data, dummy)
+                if not dummy: cls.devices[device.unique] = device
+                else: dummies.append(device)
+        
+        if dummies: return dummies
+
+
+class DB_Unpickler(pickle.Unpickler):
+    # databases pickled by the GUI refer to the classes as prmp_adb.* or, from a run as a script, __main__.*
+    def find_class(self, module, name):
+        if module in ('prmp_adb', '__main__') and name in globals(): module = __name__
+        return super().find_class(module, name)
+
+
+def load(keep=False):
+    # plain pickle, optionally zlib'd, so headless tools need nothing of the GUI library.
+    try:
+        with open(DEFAULT_DB, 'rb') as file: data = file.read()
+        if data[:1] == b'x': data = zlib.decompress(data)
+        obj = DB_Unpickler(io.BytesIO(data)).load()
+    except FileNotFoundError: return
+    except Exception as error:
+        # a broken db shouldn't stop anything starting; the next save replaces it.
+        print(f'{DEFAULT_DB} not loaded: {error!r}', file=sys.stderr)
+        return
+
+    # keep: only fill in devices this session doesn't already hold, so a save doesn't revert them to the last saved scan.
+    if keep: obj = {unique: device for unique, device in obj.items() if unique not in Devices.devices}
+    Devices.devices.update(obj)
+    return obj
+
+
+def save(create=0):
+    load(keep=True)
+
+    if create: Devices.create_devices()
+
+    obj = Devices.devices
+
+    # written beside it and renamed over it, so a crash mid-write leaves the last good db.
+    temp = f'{DEFAULT_DB}.{os.getpid()}.tmp'
+    with open(temp, 'wb') as file: file.write(zlib.compress(pickle.dumps(obj, pickle.HIGHEST_PROTOCOL), 1))
+    os.replace(temp, DEFAULT_DB)
+
+    for device in obj.values():
+        # Windows won't replace a tree a window still has mapped; it is only a cache, and mapped_fresh() passes over it until the next save.
+        try: device.save_mapped()
+        except PermissionError: ...
@@ -0,0 +1,355 @@
+
+import os, sys, json, threading, itertools, argparse, secrets, hmac, urllib.request, urllib.parse, urllib.error, http.server
+
+from adb_core import *
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8037
+TOKEN_HEADER = 'X-PRMP-Token'
+
+
+# any web page can post to localhost, so every request carries a per-session token that only this user can read.
+def token_path(port): return os.path.join(os.path.expanduser('~'), f'.prmp_adb_server_{port}.token')
+
+
+def write_token(port):
+    token, path = secrets.token_hex(16), token_path(port)
+    with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as file: file.write(token)
+    # O_CREAT's mode doesn't apply to a token file left by an earlier server.
+    os.chmod(path, 0o600)
+    return token
+
+
+def read_token(port):
+    try:
+        with open(token_path(port)) as file: return file.read().strip()
+    except OSError: return ''
+
+
+def device_info(device):
+    root = device.root_directory
+    return dict(unique=device.unique, name=device.name, model=device.model, product=device.product, brand=device.brand, manufacturer=device.manufacturer, transport_id=device.transport_id, scanned=bool(root), folders=len(root.all_folders) if root else 0, files=len(root.all_files) if root else 0, snapshots=len(device.get('snapshots') or []))
+
+
+def info_device(info):
+    # a dummy Device from device_info(), as if from 'adb devices -l', for a client to show.
+    return Device(f"{info['unique']} device product:{info['product']} model:{info['model']} device:{info['name']} transport_id:{info['transport_id']}", dummy=True)
+
+
+def entry_info(obj):
+    info = dict(path=obj.path, name=obj.basename, file=bool(obj.file), size=obj.full_size)
+    if obj.file: info['ext'] = obj.ext
+    else: info['children'] = len(obj)
+    return info
+
+
+def find_device(unique=None):
+    if unique:
+        device = Devices.devices.get(unique)
+        if not device: raise ADB_Error(f'Unknown device {unique}.')
+    else:
+        devices = Devices.list()
+        if not devices: raise ADB_Error('No device has been scanned yet.')
+        device = devices[0]
+
+    return device
+
+
+def find_root(unique=None):
+    device = find_device(unique)
+    if not device.root_directory: raise ADB_Error(f'{device.unique} has no scanned root directory.')
+    return device.root_directory
+
+
+def find_folder(unique=None, path=''):
+    root = find_root(unique)
+    if not path or path == '/': return root
+
+    folder = root.find_folder(path.rstrip('/'))
+    if not folder: raise ADB_Error(f'{path} is not a scanned folder.')
+    return folder
+
+
+def scan_device(unique=None):
+    device = Devices.devices.get(unique) if unique else next(iter(Devices.list()), None)
+    if device and device.root_directory: device.root_directory.rescan()
+    else:
+        connecteds = [device for device in Devices.create_devices(1) or [] if not unique or device.unique == unique]
+        if not connecteds: raise ADB_Error(f'{unique} is not connected.')
+        device = connecteds[0]
+        Devices.add_device(device)
+
+    return device
+
+
+def apk_sets(apks): return [apk.split(',') if ',' in apk else apk for apk in apks]
+
+
+def report_info(report): return dict(mode=report.mode, files=report.files, size=report.size, elapsed=report.elapsed, throughput=report.throughput, error=report.error.decode(errors='replace'))
+
+
+class ADB_Server(http.server.ThreadingHTTPServer):
+    # owns adb for every client: one in-memory Devices cache, and `lock` keeps scans and transfers from running over each other.
+    daemon_threads = True
+
+    def __init__(self, address=(DEFAULT_HOST, DEFAULT_PORT), db=True):
+        super().__init__(address, ADB_Request_Handler)
+        self.lock = threading.RLock()
+        self.watchers = {}
+        self.token = write_token(self.server_address[1])
+        if db: load()
+
+    def server_close(self):
+        super().server_close()
+        try:
+            if read_token(self.server_address[1]) == self.token: os.remove(token_path(self.server_address[1]))
+        except OSError: ...
+
+
+class ADB_Request_Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args): ...
+
+    def dispatch(self, method):
+        url = urllib.parse.urlsplit(self.path)
+        self.query = urllib.parse.parse_qs(url.query)
+        handler = getattr(self, f'{method}_{url.path.strip("/") or "devices"}', None)
+
+        # a browser always sends Origin on cross-site requests, and no client of ours does.
+        if self.headers.get('Origin') is not None: return self.send_json(dict(error='Cross-origin requests are refused.'), 403)
+        if not hmac.compare_digest(self.headers.get(TOKEN_HEADER, ''), self.server.token): return self.send_json(dict(error='Missing or wrong server token.'), 403)
+
+        if not handler: return self.send_json(dict(error=f'No such endpoint {url.path}'), 404)
+
+        try: handler()
+        except ADB_Error as error: self.send_json(dict(error=str(error)), 400)
+        except Exception as error: self.send_json(dict(error=repr(error)), 500)
+
+    def do_GET(self): self.dispatch('get')
+
+    def do_POST(self): self.dispatch('post')
+
+    def arg(self, name, default=None):
+        values = self.query.get(name)
+        return values[0] if values else default
+
+    def args(self, name): return self.query.get(name, [])
+
+    def flag(self, name): return self.arg(name, '0') not in ('0', '', 'false')
+
+    def send_json(self, obj, status=200):
+        data = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_stream(self, objs):
+        # NDJSON over chunked encoding, written as the generator produces it.
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def chunk(data): self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+        try:
+            for obj in objs: chunk(json.dumps(obj).encode() + b'\n')
+        except Exception as error: chunk(json.dumps(dict(error=str(error))).encode() + b'\n')
+        chunk(b'')
+
+    def send_file(self, path):
+        size = os.path.getsize(path)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+
+        with open(path, 'rb') as file:
+            for data in iter(lambda: file.read(1 << 20), b''): self.wfile.write(data)
+
+    def get_devices(self):
+        if self.flag('connected'):
+            with self.server.lock: devices = Devices.create_devices(1) or []
+        else: devices = Devices.list()
+        self.send_json([device_info(device) for device in devices])
+
+    # a watcher changes the tree under the lock, so whatever walks it collects under the lock and streams afterwards.
+    def get_ls(self):
+        with self.server.lock:
+            folder = find_folder(self.arg('device'), self.arg('path'))
+            view = folder.view(self.arg('order', ''), self.flag('reverse'))
+            size = int(self.arg('size', 0))
+            infos = [entry_info(obj) for obj in (view.page(int(self.arg('page', 0)), size) if size else view)]
+        self.send_stream(infos)
+
+    def get_search(self):
+        with self.server.lock:
+            folders, files = find_root(self.arg('device')).search(self.arg('q', ''), self.flag('case'), self.flag('match'))
+            infos = [entry_info(obj) for obj in itertools.chain(folders, files)]
+        self.send_stream(infos)
+
+    def get_stats(self):
+        with self.server.lock: summary = find_root(self.arg('device')).storage_stats.summary()
+        self.send_json(summary)
+
+    def get_du(self):
+        with self.server.lock:
+            folder = find_folder(self.arg('device'), self.arg('path'))
+            stats = find_root(self.arg('device')).storage_stats
+            infos = [dict(path=obj.path, file=bool(obj.file), size=obj.full_size if obj.file else stats.folder_size(obj)) for obj in folder]
+        self.send_stream(infos)
+
+    def get_diff(self):
+        device = find_device(self.arg('device'))
+        snapshots = device.get('snapshots') or []
+        if len(snapshots) < 2: raise ADB_Error(f'{device.unique} needs two snapshots to diff.')
+
+        diff = Snapshot_Diff(snapshots[-2], snapshots[-1])
+        self.send_stream(dict(change=change, path=path, old_size=old, new_size=new, file=bool(kind)) for change, path, old, new, kind in diff)
+
+    def get_scheduler(self): self.send_json(ADB.scheduler.stats())
+
+    def get_tree(self):
+        device = find_device(self.arg('device'))
+        with self.server.lock:
+            if not device.mapped_fresh(): device.save_mapped()
+            # sent under the lock as well, so no save replaces it mid-download.
+            self.send_file(device.mapped_path)
+
+    def post_scan(self):
+        with self.server.lock: device = scan_device(self.arg('device'))
+        self.send_json(device_info(device))
+
+    def post_pull(self):
+        fds = self.args('path')
+        root = find_root(self.arg('device'))
+        srcs = [root.all_files.get(path.lower()) or root.find_folder(path) or path for path in fds]
+
+        with self.server.lock, Command_Context(root.serial): report = Bulk_Pull(srcs, self.arg('dest', '.')).exec(quiet=1)
+        self.send_json(report_info(report))
+
+    def post_push(self):
+        with self.server.lock, Command_Context(self.arg('device')): report = Bulk_Push(self.arg('src'), self.arg('dest')).exec(quiet=1)
+        self.send_json(report_info(report))
+
+    def post_watch(self):
+        device = find_device(self.arg('device'))
+        watcher = self.server.watchers.pop(device.unique, None)
+        if watcher: watcher.stop()
+
+        if self.flag('on'):
+            watcher = self.server.watchers[device.unique] = Tree_Watcher(find_root(device.unique), lock=self.server.lock)
+            watcher.start()
+
+        self.send_json(dict(unique=device.unique, watching=bool(watcher and watcher.running), polling=bool(watcher and watcher.polling)))
+
+    def get_packages(self):
+        with self.server.lock: inventory = Device_Packages.inventory(self.arg('device') or find_device().unique)
+        if self.flag('refresh') or not inventory.refreshed:
+            with self.server.lock: inventory.refresh()
+        self.send_stream(package.info() for package in inventory)
+
+    def post_install(self):
+        fleet = Fleet(self.args('device') or None, int(self.arg('workers', 8)))
+        with self.server.lock: self.send_stream(result.info() for result in fleet.install(apk_sets(self.args('apk')), self.flag('replace'), self.flag('downgrade'), self.flag('grant')))
+
+    def post_uninstall(self):
+        fleet = Fleet(self.args('device') or None, int(self.arg('workers', 8)))
+        with self.server.lock: self.send_stream(result.info() for result in fleet.uninstall(self.args('package'), self.flag('keep')))
+
+    def post_save(self):
+        with self.server.lock: save()
+        self.send_json(dict(saved=len(Devices.devices)))
+
+
+class ADB_Client:
+    # what the GUI and scripts use instead of scanning themselves when a server is running.
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=None):
+        self.url = f'http://{host}:{port}'
+        self.port = port
+        self.timeout = timeout
+
+    def _open(self, method, endpoint, params={}, timeout=None):
+        query = urllib.parse.urlencode({key: value for key, value in params.items() if value is not None}, doseq=True)
+        # read per request: a restarted server writes a new token.
+        request = urllib.request.Request(f'{self.url}/{endpoint}?{query}', method=method, headers={TOKEN_HEADER: read_token(self.port)})
+
+        try: return urllib.request.urlopen(request, timeout=timeout or self.timeout)
+        except urllib.error.HTTPError as error: raise ADB_Error(json.loads(error.read() or b'{}').get('error', str(error)))
+
+    def running(self):
+        try:
+            with self._open('GET', 'devices', timeout=.5): return True
+        except (OSError, ADB_Error): return False
+
+    def request(self, method, endpoint, **params):
+        with self._open(method, endpoint, params) as response: return json.loads(response.read())
+
+    def stream(self, endpoint, method='GET', **params):
+        with self._open(method, endpoint, params) as response:
+            for line in response:
+                obj = json.loads(line)
+                if 'error' in obj and len(obj) == 1: raise ADB_Error(obj['error'])
+                yield obj
+
+    def devices(self, connected=False): return self.request('GET', 'devices', connected=int(connected))
+
+    def scheduler(self): return self.request('GET', 'scheduler')
+
+    def scan(self, device=None): return self.request('POST', 'scan', device=device)
+
+    def ls(self, device=None, path='', order='', reverse=False, page=0, size=0): return self.stream('ls', device=device, path=path, order=order, reverse=int(reverse), page=page, size=size)
+
+    def search(self, q, device=None, case=False, match=False): return self.stream('search', device=device, q=q, case=int(case), match=int(match))
+
+    def stats(self, device=None): return self.request('GET', 'stats', device=device)
+
+    def du(self, device=None, path=''): return self.stream('du', device=device, path=path)
+
+    def diff(self, device=None): return self.stream('diff', device=device)
+
+    def pull(self, paths, dest, device=None): return self.request('POST', 'pull', device=device, path=list(paths), dest=os.path.abspath(dest))
+
+    def push(self, src, dest, device=None): return self.request('POST', 'push', device=device, src=os.path.abspath(src), dest=dest)
+
+    def watch(self, device=None, on=True): return self.request('POST', 'watch', device=device, on=int(on))
+
+    def packages(self, device=None, refresh=False): return self.stream('packages', device=device, refresh=int(refresh))
+
+    def install(self, apks, devices=None, replace=True, downgrade=False, grant=False, workers=8): return self.stream('install', 'POST', device=devices, apk=[','.join(map(os.path.abspath, apk)) if isinstance(apk, list) else os.path.abspath(apk) for apk in apks], replace=int(replace), downgrade=int(downgrade), grant=int(grant), workers=workers)
+
+    def uninstall(self, packages, devices=None, keep_data=False, workers=8): return self.stream('uninstall', 'POST', device=devices, package=list(packages), keep=int(keep_data), workers=workers)
+
+    def save(self): return self.request('POST', 'save')
+
+    def tree(self, device, path):
+        # downloaded beside `path` and renamed into place, so an open copy is never written under.
+        temp = f'{path}.{os.getpid()}.tmp'
+        try:
+            with self._open('GET', 'tree', dict(device=device)) as response, open(temp, 'wb') as file:
+                for data in iter(lambda: response.read(1 << 20), b''): file.write(data)
+            os.replace(temp, path)
+        finally:
+            if os.path.exists(temp): os.remove(temp)
+        return Mapped_Tree(path)
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT):
+    server = ADB_Server((host, port))
+    print(f'PRMP ADB server on http://{host}:{port}', file=sys.stderr)
+    try: server.serve_forever()
+    except KeyboardInterrupt: ...
+    finally: server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Headless PRMP ADB server.')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    serve(args.host, args.port)
@@ -1,15 +1,16 @@
 
-import os, subprocess, shlex, threading, time, io, itertools
+import os, re, subprocess, shlex, threading, time, io, itertools, queue
+import tkinter.filedialog as filedialog
 
 from prmp_gui import *
 from prmp_miscs import *
 from adb_images import ADB_IMAGES
+from adb_core import *
+from adb_core import _PIL_
+from adb_server import ADB_Client, info_device
 
+if _PIL_: from PIL import ImageTk as PIL_ImageTk
 
-DEFAULT_PATH = '/storage/emulated'
-DEFAULT_DB = 'android_datas.db'
-
-ADB_EXE = r'adb.exe'
 
 def check_assets():
     name = lambda p: os.path.splitext(p)[0]
@@ -28,458 +29,6 @@ def check_assets():
             f = PRMP_File(a, b64=data)
             f.save()
 
-check_assets()
-
-class ADB_Error(Exception): ...
-
-
-class Process:
-    last_error = ''
-    
-    def __init__(self, process, quiet=False):
-        self.data = self.stdout = process.stdout.read()
-        self.error = self.stderr = process.stderr.read()
-
-        self.data_error = self.data, self.error
-
-        if self.stderr and not self.stdout and not quiet:
-            Process.last_error = self.stderr
-            raise ADB_Error(self.stderr)
-
-
-class Command:
-
-    @classmethod
-    def _exec(cls, args='', **kwargs):
-        if args:
-            if isinstance(args, str): args = shlex.split(args)
-            # print(args)
-        
-        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=False, **kwargs)
-        return process
-
-    @classmethod
-    def exec(cls, args='', quiet=False,  **kwargs): return Process(cls._exec(args, **kwargs), quiet)
-
-
-class ADB:
-    sub_command = ''
-
-    @classmethod
-    def _exec(cls, args='', **kwargs):
-        if args:
-            if isinstance(args, str): args = shlex.split(args)
-            if cls.sub_command: args = [cls.sub_command, *args]
-            args = [ADB_EXE, *args]
-        else: args = [ADB_EXE]
-        
-        cls.process =  process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=False, **kwargs)
-        return process
-
-
-    @classmethod
-    def exec(cls, args='', quiet=False, **kwargs): return Process(cls._exec(args, **kwargs), quiet)
-
-
-class File_Transfer(ADB):
-
-    def __init__(self, src, dest):
-        self.src = str(src)
-        self.dest = str(dest)
-        super().__init__()
-    
-    def exec(self, **kwargs): return super().exec([self.src, self.dest], **kwargs)
-
-
-class Pull(File_Transfer): sub_command = 'pull'
-
-
-class Push(File_Transfer): sub_command = 'push'
-
-
-class Shell(ADB): sub_command = 'shell'
-
-
-class Base:
-    def get(self, name, default=None): return getattr(self, name, default)
-
-    @property
-    def subs(self): return  []
-
-    def __len__(self):
-        if self.subs: return len(self[:])
-        return 0
-    
-    def __eq__(self, other):
-        if not other: return False
-        if isinstance(other, str): return (str(other) == self.name)
-        return (other.name == self.name) and (other.parent == self.parent)
-    
-    @property
-    def className(self): return self.__class__.__name__
-
-    @property
-    def name(self): return f'{self.className}({self.basename}, size={self.size})'
-
-    def __repr__(self): return f'<{self.name}>'
-    
-    def __str__(self): return self.path
-
-    def __bool__(self): return True
-
-    def __hash__(self): return hash((self.name, self.parent))
-
-    def slash(self, path):
-        if path.startswith('/'): path = path[1:]
-        if path.endswith('/'): path = path[:-1]
-        return path
-    
-    @property
-    def basename(self): return os.path.basename(self.path)
-    
-    def download(self, dest):
-        proc = Pull(self.path, dest).exec()
-        return proc
-    
-    def float_size(self, size):
-        if isinstance(size, bytes): size = size.decode()
-        size = str(size)
-        if not size: size = '0'
-        
-        byte = 1024
-        si_dt = {'K': byte, 'M': byte**2, 'G': byte**3}
-        si = size[-1]
-
-        if si in si_dt:
-            dt = si_dt[si]
-            dat = float(size[:-1]) * dt
-        else: dat = float(size)/2 * byte
-        
-        return dat
-    
-    def format_size(self, size):
-        byte = 1024
-        si_dt = {'K': byte, 'M': byte**2, 'G': byte**3}
-        size = float(size)
-
-        if size >= si_dt['G']: dat = f"{size/si_dt['G']:.02f} G"
-        elif size >= si_dt['M']: dat = f"{size/si_dt['M']:.02f} M"
-        elif size >= si_dt['K']: dat = f"{size/si_dt['K']:.02f} K"
-        else: dat = f"{size:.02f} B"
-
-        return dat
-
-    def pull(self, dest):
-        proc = Pull(self.path, dest).exec()
-        return proc.data_error
-
-
-class File(Base):
-    file = 1
-
-    @property
-    def subs(self): return []
-
-    def __init__(self, parent, path, size):
-        self.parent = parent
-        self.path = path
-        self.full_size = self.float_size(size)
-        self.size = self.format_size(self.full_size)
-    
-    @property
-    def ext(self): return os.path.splitext(self.basename)[1][1:]
-
-
-class Folder(Base):
-    file = 0
-
-    def __init__(self, parent=None, path=''):
-        self.parent = parent
-        self.path = path
-        self.all_folders = self.folders = {}
-        self.files = {}
-
-    def get_parent_folder(self, name):
-        if isinstance(name, bytes): name = name.decode()
-        name = name.lower()
-
-        parent = os.path.dirname(str(name))
-        # print(f'{name} <> "{parent}" <> {[self.path, "/storage"]}')
-
-        if parent in [self.path, '/storage']: return self
-        elif parent in self.all_folders: return self.all_folders.get(parent)
-        # else: raise ValueError(f'{parent} is not in this filesystem')
-
-    def add_folder(self, path):
-        folder = Folder(self, path)
-        self.folders[path.lower()] = folder
-        return folder
-
-    def add_file(self, path, size='0'):
-        file = File(self, path, size)
-        self.files[path.lower()] = file
-        return file
-    
-    def create_file(self, path, size='0'):
-        parent = self.get_parent_folder(path)
-        if parent and parent.path != self.path: file = parent.create_file(path, size)
-        else: file = self.add_file(path, size)
-
-        return file
-    
-    def create_folder(self, name):
-        parent = self.get_parent_folder(name)
-        if parent and parent.path != self.path: folder = parent.create_folder(name)
-        else: folder = self.add_folder(name)
-
-        return folder
-    
-    @property
-    def folder_s(self): return list(self.folders.values())
-    
-    @property
-    def subs(self): return self[:]
-
-    @property
-    def file_s(self): return list(self.files.values())
-    
-    def __getitem__(self, item):
-        items = [*self.folders.values(), *self.files.values()]
-        return items[item]
-        
-    def get_folder(self, folder):
-        folder = f'{self.path}/{self.slash(folder)}'.lower()
-        return self.folders.get(folder)
-    
-    @property
-    def folders_count(self):
-        count = len(self.folder_s)
-        for folder in self.folder_s: count += folder.folders_count
-        return count
-
-    @property
-    def files_count(self):
-        count = len(self.file_s)
-        for folder in self.folder_s: count += folder.files_count
-        return count
-    
-    @property
-    def full_size(self):
-        size = sum([float(file.full_size) for file in self.file_s])
-        for folder in self.folder_s: size += folder.full_size
-        return size
-    
-    @property
-    def size(self): return self.format_size(self.full_size)
-
-
-class Root_Directory(Folder):
-    path = '/'
-
-    def __init__(self, device):
-        super().__init__(device, self.path)
-        self.device = device
-        
-        self.all_folders = {}
-        self.all_files = {}
-        
-        if device.filesystems:
-            strs_fs = [fs.mounted_on for fs in device.filesystems[-2:]]
-            if strs_fs[0] != DEFAULT_PATH: strs_fs = ['/sdcard']
-
-            for fs in strs_fs: self.load(fs)
-
-    @property
-    def basename(self): return self.path
-
-    def create_file(self, path, size='0'):
-        file = super().create_file(path, size)
-        self.all_files[file.path.lower()] = file
-        return file
-    
-    def create_folder(self, path):
-        folder = super().create_folder(path)
-        self.all_folders[folder.path.lower()] = folder
-        return folder
-
-    def load(self, path):
-        if path == DEFAULT_PATH: path = '/sdcard'
-
-        data, error = Shell.exec(f'ls {path} -pRhs', 1).data_error
-        data = data.decode()
-        # data = path
-
-        if not data: raise ADB_Error(f'An error must have occured, no data to parse.', error)
-
-        lines = data.splitlines()
-        last_folder = ''
-
-        for line in lines:
-            if line:
-                if line.endswith(':'):
-                    last_folder = self.create_folder(line[:-1]).path
-
-                if 'total ' in line or line.endswith('/') or line.endswith(':'): continue
-
-                line = line.lstrip(' ')
-                a = line.split(' ', 1)
-                a.reverse()
-
-                file_path = f'{last_folder}/{a[0]}'
-                a[0] = file_path
-
-                # if last_folder:
-                #     file = last_folder.add_file(a[0], a[1])
-                #     self.all_files[file.path] = file
-                self.create_file(*a)
-
-
-class FileSystem:
-    def __str__(self): return self.mounted_on
-    def __repr__(self): return f'<{self.name}>'
-    
-    @property
-    def subs(self): return []
-    @property
-    def name(self): return f'FileSystem({self.mounted_on})'
-
-    def __init__(self, data, type=1):
-        self.type = type
-        if self.type == 1: self.path, self.total, self.used, self.available, self.percentage_use, self.mounted_on = data.split()
-        
-        elif self.type == 2: self.path, self.total, self.used, self.available = data.split()
-
-
-        self.used = Base.float_size(self, self.used)
-        self.available = Base.float_size(self, self.available)
-        self.total = Base.float_size(self, self.total)
-
-    @property
-    def used_size(self): return Base.format_size(self, self.used)
-    @property
-    def available_size(self): return Base.format_size(self, self.available)
-    @property
-    def total_size(self): return Base.format_size(self, self.total)
-
-
-class Device:
-    def get(self, name, default=None): return getattr(self, name, default)
-    
-    def _split(self, data): return data.split(':')[1]
-    def _splits(self, *datas): return [self._split(data) for data in datas]
-
-    def _split2(self, data): return data.split(': [')[1][:-1]
-    def _splits2(self, *datas): return [self._split2(data) for data in datas]
-    subs = []
-
-    def __init__(self, data, dummy=False):
-        self.dummy = dummy
-        self.root_directory = None
-
-        self.unique, _, self.product, self.model, self.name, self.transport_id = data.split()
-
-        self.product, self.name, self.model, self.transport_id = self._splits(self.product, self.name, self.model, self.transport_id)
-        
-        self.brand = self.manufacturer = ''
-        self.filesystems = []
-
-        self.load()
-    
-    def load(self):
-        if not self.dummy:
-            ADB.exec('root')
-            self.getprop()
-            self.df()
-            self.root_directory = Root_Directory(self)
-
-    def getprop(self):
-        process = Shell.exec('getprop')
-        data = process.data.decode()
-        for line in data.splitlines():
-            if 'ro.product.brand' in line: self.brand = self._split2(line)
-            elif 'ro.product.manufacturer' in line: self.manufacturer = self._split2(line)
-
-    def df(self):
-        process = Shell.exec('df')
-        data = process.data.decode()
-        header, *datas = data.splitlines()
-        header = header.split()
-        
-        if header == 'Filesystem                                                     1K-blocks    Used Available Use% Mounted on'.split(): type = 1
-        elif header == 'Filesystem               Size     Used     Free   Blksize'.split(): type = 2
-        
-        for data in datas:
-            if data and 'Permission denied' not in data:
-                filesystem = FileSystem(data, type)
-                self.filesystems.append(filesystem)
-    
-    def __str__(self): return f'Device{self.name, self.unique}'
-    def __repr__(self): return f'{self}>'
-
-
-class Devices:
-    devices = {}
-    
-    @classmethod
-    def list(cls): return list(cls.devices.values())
-
-    @classmethod
-    def add_device(cls, device):
-        if device.dummy:
-            device.dummy = False
-            device.load()
-        Devices.devices[device.unique] = device
-
-    @classmethod
-    def create_devices(cls, dummy=False):
-        process = ADB.exec('devices -l')
-        data = process.data.decode()
-        data = data.strip()
-        _, *datas = data.splitlines()
-        dummies = []
-
-        if len(datas) == 0: raise ADB_Error('No device is connected')
-        
-        for data in datas:
-            if 'unauthorized' in data: raise ADB_Error('''This adb server's $ADB_VENDOR_KEYS is not set
-Try 'adb kill-server' if that seems wrong.
-Otherwise check for a confirmation dialog on your device.
-List of devices attached''')
-            elif 'offline' in data: raise ADB_Error('Device is cuurently offline, please detach and reattach the USB cable on the device.')
-            
-            else:
-                device = Device(data, dummy)
-                if not dummy: cls.devices[device.unique] = device
-                else: dummies.append(device)
-        
-        if dummies: return dummies
-
-
-def load():
-    f = PRMP_File(DEFAULT_DB)
-    try:
-        obj = f.loadObj()
-        Devices.devices.update(obj)
-        return obj
-    except: ...
-
-
-def save(create=0):
-    load()
-
-    if create: Devices.create_devices()
-
-    obj = Devices.devices
-
-    try: os.remove(DEFAULT_DB)
-    except: ...
-
-    f = PRMP_File(DEFAULT_DB)
-    f.saveObj(obj)
-    f.save()
-
-load()
-image_size = (24, 24)
 images = dict(**ADB_IMAGES['png'])
 images.update(ADB_IMAGES['gif'])
 images.update(ADB_IMAGES['ico'])
@@ -490,6 +39,8 @@ images.update(ADB_IMAGES['ico'])
 class Gui(PRMP_MainWindow):
     images_images = {}
     loaded = 0
+    scheduler = None
+    task_delay = 50
     def __init__(self, master=None, **kwargs):
         super().__init__(master, **kwargs)
         
@@ -502,6 +53,36 @@ class Gui(PRMP_MainWindow):
 
             Gui.loaded = 1
 
+        # workers never touch Tk, they post to task_events and drainTasks runs the callbacks here on the main thread.
+        if not Gui.scheduler: Gui.scheduler = Task_Scheduler()
+        self.task_events = queue.Queue()
+        self.running_tasks = []
+        self.after(self.task_delay, self.drainTasks)
+
+    def run_task(self, func, *args, done=None, error=None, progress=None, name='Task', pass_task=False, priority=None, cancelled=None, **kwargs):
+        if error is None: error = lambda e: ErrorBox(self, title=f'{name} Error', msg=e)
+
+        task = Task(func, args, kwargs, events=self.task_events, done=done, error=error, progress=progress, name=name, pass_task=pass_task, priority=priority, cancelled=cancelled)
+        self.running_tasks.append(task)
+        return Gui.scheduler.submit(task)
+
+    def drainTasks(self):
+        for task, event, value in Task_Scheduler.drain(self.task_events):
+            if event == 'progress':
+                if task.on_progress: task.on_progress(*value)
+                continue
+
+            if task in self.running_tasks: self.running_tasks.remove(task)
+            if event == 'done' and task.done: task.done(value)
+            elif event == 'error' and task.error: task.error(value)
+            elif event == 'cancelled' and task.on_cancel: task.on_cancel(value)
+
+        self.after(self.task_delay, self.drainTasks)
+
+    def cancel_tasks(self, *names):
+        for task in self.running_tasks:
+            if not names or task.name in names: task.cancel()
+
 
 class ErrorBox(PRMP_MsgBox):
 
@@ -581,6 +162,10 @@ class FolderView(Frame):
 
     name, size, type, files, folders = dict(text='Name', attr='basename', width=160), dict(text='Size'), dict(text='Type', attr='ext'), dict(text='Files', attr='files_count', width=10), dict(text='Folders', attr='folders_count', width=10)
     _number = 0
+    page_size = 200
+    orders = ['', 'name', 'size', 'type', 'count']
+    thumbnailer = None
+    poll_delay = 150
 
     def __init__(self, master, command=None, **kwargs):
         super().__init__(master, **kwargs)
@@ -589,9 +174,25 @@ class FolderView(Frame):
         self.columns = 4
         self.command = command
         self.number = FolderView._number
-        
 
-        self.folder_name = Button(self, text='Folder View', place=dict(relx=0, rely=0, relh=.05, relw=1), command=lambda: EnterPath(self, callback=self.receiveJump, default=self.folder_name.get(), text='Jump to path   '), font=dict(family='Times New Roman', weight='bold', size=15))
+        self.folder = None
+        self.list_views = {}
+        self.photos = {}
+        self.pending = set()
+        self.shown = set()
+        self.rows = {}
+
+        if _PIL_ and not FolderView.thumbnailer: FolderView.thumbnailer = Thumbnailer()
+        self.order = ''
+        self.reverse = False
+        self.page_index = 0
+
+        self.folder_name = Button(self, text='Folder View', place=dict(relx=0, rely=0, relh=.05, relw=.64), command=lambda: EnterPath(self, callback=self.receiveJump, default=self.folder_name.get(), text='Jump to path   '), font=dict(family='Times New Roman', weight='bold', size=15))
+
+        self.order_button = Button(self, text='Order: -', place=dict(relx=.64, rely=0, relh=.05, relw=.14), command=self.nextOrder)
+        Button(self, text='<', place=dict(relx=.78, rely=0, relh=.05, relw=.05), command=lambda: self.showPage(self.page_index-1))
+        self.page_label = Label(self, text='1/1', place=dict(relx=.83, rely=0, relh=.05, relw=.12))
+        Button(self, text='>', place=dict(relx=.95, rely=0, relh=.05, relw=.05), command=lambda: self.showPage(self.page_index+1))
 
         self.view = Hierachy(self, place=dict(relx=0, rely=.05, relh=.95, relw=1), image_get=self.image_get)
 
@@ -600,13 +201,101 @@ class FolderView(Frame):
         self.view.tree.bind('<Double-1>', self.folderContextMenu)
 
         self.viewObjs = self.view.viewObjs
+        if FolderView.thumbnailer: self.after(self.poll_delay, self.pollThumbnails)
     
+    @property
+    def serial(self): return self.device.unique if isinstance(self.device, Device) else None
+
     def image_get(self, obj):
         if obj.file: ext = obj.ext.lower()
         else: ext = 'folder'
 
+        thumbnailer = FolderView.thumbnailer
+        if thumbnailer and thumbnailer.wants(obj):
+            key = Thumbnail_Cache.key(obj)
+            photo = self.photos.get(key)
+            if photo: return photo
+
+            image = thumbnailer.cache.get(key)
+            if image is not None:
+                photo = self.photos[key] = PIL_ImageTk.PhotoImage(image)
+                return photo
+
+            self.pending.add(thumbnailer.request(obj, 0, self.serial))
+
         img = Gui.images_images.get(ext, 'hlp')
         return img
+
+    def prefetch(self, objs):
+        thumbnailer = FolderView.thumbnailer
+        if thumbnailer:
+            for obj in objs:
+                if thumbnailer.wants(obj): self.pending.add(thumbnailer.request(obj, 1, self.serial))
+
+    def pollThumbnails(self):
+        thumbnailer = FolderView.thumbnailer
+        ready = [key for key in self.pending if thumbnailer.cache.has(key)]
+
+        if ready:
+            self.pending.difference_update(ready)
+            # only the rows whose thumbnail arrived get their image swapped, the page is not rebuilt.
+            for key in ready:
+                row = self.rows.get(key)
+                image = thumbnailer.cache.get(key) if row else None
+                if image is not None:
+                    photo = self.photos[key] = PIL_ImageTk.PhotoImage(image)
+                    self.view.tree.item(row, image=photo)
+
+        with thumbnailer.lock: queued = set(thumbnailer.queued)
+        self.pending.intersection_update(queued | self.shown)
+        self.after(self.poll_delay, self.pollThumbnails)
+
+    def viewFolder(self, folder):
+        self.folder = folder
+        self.list_views = {}
+        self.showPage(0)
+
+    def children_view(self):
+        folder = self.folder
+        if isinstance(folder, Folder): return folder.view(self.order, self.reverse)
+
+        key = self.order, self.reverse
+        view = self.list_views.get(key)
+        if view is None: view = self.list_views[key] = Children_View(folder, *key)
+        return view
+
+    def showPage(self, index=None):
+        if self.folder is None: return
+        if index is None: index = self.page_index
+
+        view = self.children_view()
+        pages = view.pages_count(self.page_size)
+        self.page_index = min(max(index, 0), pages-1)
+
+        self.page_label.config(text=f'{self.page_index+1}/{pages}')
+
+        page = view.page(self.page_index, self.page_size)
+        thumbnailer = FolderView.thumbnailer
+        if thumbnailer:
+            self.shown = {Thumbnail_Cache.key(obj) for obj in page if thumbnailer.wants(obj)}
+            self.photos = {key: photo for key, photo in self.photos.items() if key in self.shown}
+
+        self.viewObjs(page)
+        # the top-level rows are inserted in page order.
+        if thumbnailer: self.rows = {Thumbnail_Cache.key(obj): row for row, obj in zip(self.view.tree.get_children(), page) if thumbnailer.wants(obj)}
+        # the rows one page away are the next to scroll into view.
+        self.prefetch(view.page(self.page_index+1, self.page_size))
+        if self.page_index: self.prefetch(view.page(self.page_index-1, self.page_size))
+
+    def nextOrder(self):
+        if self.reverse or not self.order:
+            self.order = self.orders[(self.orders.index(self.order)+1) % len(self.orders)]
+            self.reverse = False
+        else: self.reverse = True
+
+        text = (self.order or '-').title() + (' v' if self.reverse else '')
+        self.order_button.config(text=f'Order: {text}')
+        self.showPage()
     
     def sendCommand(self):
         if self.command: self.command(self.number, self.view.selected())
@@ -615,16 +304,16 @@ class FolderView(Frame):
         path = path.get('path')
         if path:
             path = path.lower()
-            root_d = self.device.root_directory
+            root_d = self.master.root_d
 
             if len(root_d) >= self.number:
                 root = root_d[self.number-1]
                 
-                folder = root_d.all_folders.get(path)
+                folder = root_d.find_folder(path)
                 if folder:
                     if folder.path.startswith(root.path):
                         self.folder_name.config(text=path)
-                        self.viewObjs(folder)
+                        self.viewFolder(folder)
                     else: folder = None
     
                 if not folder: ErrorBox(self, title='Path Error', msg=f'The provided path: {path} is invalid.')
@@ -662,18 +351,27 @@ class FolderViews(SFrame):
         views = [self.view1, self.view2]
 
         rd = fds or device.root_directory
+        self.root_d = fds if isinstance(fds, Mapped_Entry) else device.root_directory
 
         for folder, view in itertools.zip_longest(rd, views):
             if view:
                 view.bind('<FocusIn>', self.set_current_view)
-                if folder: view.viewObjs(folder)
+                if folder: view.viewFolder(folder)
     
+    def live(self):
+        # a mapped tree can't change, so watching moves the views onto the device's own tree at the same folders.
+        root = self.root_d = self.device.root_directory
+        for view in (self.view1, self.view2):
+            if isinstance(view.folder, Mapped_Entry): view.viewFolder(root.find_folder(view.folder.path) or root)
+        return root
+
     def set_current_view(self, event): self.current_view = event.widget
     
     def place_view(self): ...
 
 
 class FolderViews_Window(Gui):
+    watch_delay = 500
 
     def __init__(self, master=None, title='', geo=(800, 600), device=None, fds=(), **kwargs):
         super().__init__(master, title=title, geo=geo, asb=0, resize=(1, 0), tw=1, tipping=1, be=1, **kwargs)
@@ -689,22 +387,76 @@ class FolderViews_Window(Gui):
 
         self.folder = IconCheckbutton(frame, config=dict(text='Folder?'), place=dict(x=420, y=4, h=44, w=70), relief='flat', image='folder', imgKw=dict(b64=images['folder']), hl=1, resize=resize)
 
-        self.path = LabelEntry(frame, topKwargs=dict(text='Path'), bottomKwargs=dict(_type='path', very=1, tipKwargs=dict(text='Double click for dialog window.')), place=dict(x=2, y=2, relh=.9, w=400), orient='h', longent=.3)
+        self.path = LabelEntry(frame, topKwargs=dict(text='Path'), bottomKwargs=dict(_type='path', very=1, tipKwargs=dict(text='Double click for dialog window.')), place=dict(x=2, y=2, relh=.9, w=335), orient='h', longent=.3)
+        self.watch = IconCheckbutton(frame, config=dict(text='Watch'), place=dict(x=342, y=4, h=44, w=72), image='show', new=False, command=self.toggleWatch)
         self.path.B.bind('<Double-1>', lambda e: self.path.set(dialogFunc(path=1, folder=self.folder.get())))
 
         
         IconButton(frame, config=dict(text='Pull'), place=dict(x=500, y=4, h=44, w=70), image='pull', imgKw=dict(b64=images['pull']), hl=1, resize=(55, 55), command=lambda: self.action('pull'))
         
         IconButton(frame, config=dict(text='Push'), place=dict(x=580, y=4, h=44, w=70), image='push', imgKw=dict(b64=images['push']), hl=1, resize=resize, command=lambda: self.action('push'))
+
+        IconButton(frame, config=dict(text='Mirror'), place=dict(x=660, y=4, h=44, w=70), image='cached', hl=1, new=False, command=self.mirror)
+
+        IconButton(frame, config=dict(text='Stop'), place=dict(x=735, y=4, h=44, w=55), image='cancel.png', imgKw=dict(b64=images['cancel']), hl=1, resize=(30, 30), command=self.cancel_tasks)
         
         self.views = FolderViews(self.cont, place=dict(relx=0, y=2, h=y-80, relw=1), relief='groove', device=device, fds=fds)
+        self.watcher = None
+
+        # a mapped tree stays open for as long as this window shows it.
+        self.mapped = fds.tree if isinstance(fds, Mapped_Entry) else None
 
-        if device and not fds: self.setTitle(f'{device.name}-{device.unique} Folders')
+        self.idle_title = f'{device.name}-{device.unique} Folders' if device and not fds else title
+        if device and not fds: self.setTitle(self.idle_title)
 
         self.topest.paint()
         # self._paint()
         if not master: self.mainloop()
     
+    def toggleWatch(self):
+        if self.watcher:
+            self.watcher.stop()
+            self.watcher = None
+            return
+
+        root = self.views.root_d
+        if isinstance(root, Mapped_Entry) and self.views.device and self.views.device.root_directory: root = self.views.live()
+        if not isinstance(root, Root_Directory):
+            self.watch.set(0)
+            return ErrorBox(self, title='Watch Error', msg='Only a scanned root directory can be watched.')
+
+        # the watcher only fetches; its changes are merged here on the Tk thread so the views never see a half-applied tree.
+        self.watcher = Tree_Watcher(root, apply=False)
+        self.run_task(self.watcher.start, error=self.watchFailed, name='Watch')
+        self.after(self.watch_delay, self.pollWatch)
+
+    def watchFailed(self, error):
+        self.watcher = None
+        self.watch.set(0)
+        ErrorBox(self, title='Watch Error', msg=error)
+
+    def pollWatch(self):
+        watcher = self.watcher
+        if not watcher: return
+
+        touched = watcher.apply_pending()
+        for view in (self.views.view1, self.views.view2):
+            folder = view.folder
+            if not isinstance(folder, Folder): continue
+
+            # None: it overflowed and rescanned, so every folder object was replaced.
+            if touched is None:
+                folder = watcher.root.find_folder(folder.path)
+                if folder: view.viewFolder(folder)
+            elif folder.path.lower() in touched: view.showPage()
+
+        self.after(self.watch_delay, self.pollWatch)
+
+    def destroy(self):
+        if self.watcher: self.watcher.stop()
+        if self.mapped: self.mapped.close()
+        super().destroy()
+
     def get_fd(self):
         view = self.views.current_view
         if view:
@@ -716,14 +468,22 @@ class FolderViews_Window(Gui):
     def _action(self, w):
         if not w: return
 
-        if self.act == 'PULL': command = Pull; self.tuple.reverse()
-        else: command = Push
+        if self.act == 'PULL': command = Bulk_Pull; self.tuple.reverse()
+        else: command = Bulk_Push
+
+        # Bulk_Push walks the local folder as it is built, so building it is part of the task too.
+        self.run_task(lambda: command(*self.tuple).exec(quiet=1), done=self._processed, progress=self.showProgress, cancelled=self.idle, error=self.failed, name=self.act)
+
+    def showProgress(self, stage, detail=''): self.setTitle(f'{self.act} - {stage} {detail}')
 
-        process = command(*self.tuple)
-        self._processing(process)
+    def idle(self, *args): self.setTitle(self.idle_title)
 
-    def _processing(self, process):
-        process = process.exec(quiet=1)
+    def failed(self, error):
+        self.idle()
+        ErrorBox(self, title=f'{self.act} Error', msg=error)
+
+    def _processed(self, process):
+        self.idle()
         data, error = process.data_error
         # print(process.data_error)
 
@@ -731,6 +491,39 @@ class FolderViews_Window(Gui):
         else: PRMP_MsgBox(self, title=f'{self.act} Successful', msg=f'{data.decode()}\n from\n "{self.tuple[0]}"\n -->> \n"{self.tuple[1]}"', yes=dict(compound='left', image=PRMP_Image('ok', b64=images['ok'], for_tk=1, resize=(24, 24)), text='Ok'), geo=(400, 300), delay=0)
 
     
+    def mirror(self):
+        if not self.path.verify(): return ErrorBox(self, title='Path Error', msg='Invalid Path Error!')
+
+        fd = self.get_fd()
+        if not fd: return
+        if fd.file: return ErrorBox(self, title='Selection Error', msg='Select a folder to mirror!')
+
+        self.act = 'MIRROR'
+        self._mirror = Mirror(fd, self.path.get())
+        self.run_task(self._mirror.plan, done=self._mirror_ask, name='Mirror Plan')
+
+    def _mirror_ask(self, plan):
+        self._mirror_plan = plan
+        fd = self._mirror.folder
+
+        res = 24
+        PRMP_MsgBox(self, title='Mirror', msg=f'Mirror {fd} into {self.path.get()}?\n{self._mirror_plan}', callback=self._mirror_run, ask=1, yes=dict(compound='left', image=PRMP_Image('ok', b64=images['ok'], for_tk=1, resize=(res, res)), text='Yes'), no=dict(text='No', compound='left', image=PRMP_Image('cancel', b64=images['cancel'], for_tk=1, resize=(res, res))), geo=(400, 300))
+
+    def _mirror_run(self, w):
+        if not w: return
+
+        self.run_task(self._mirror_task, pass_task=True, progress=lambda rel, done, total: self.setTitle(f'Mirror {done}/{total}: {rel}'), done=self._mirror_done, name='Mirror')
+
+    def _mirror_task(self, task):
+        total, done = len(self._mirror_plan.pull), itertools.count(1)
+        return self._mirror.run(self._mirror_plan, callback=lambda entry, error: task.progress(entry[0], next(done), total))
+
+    def _mirror_done(self, summary):
+        msg = f"Transferred {summary['transferred']} files ({Base.format_size(self, summary['transferred_bytes'])}), skipped {summary['skipped']} files ({Base.format_size(self, summary['skipped_bytes'])}), pruned {summary['pruned']} files."
+
+        if summary['errors']: ErrorBox(self, title='MIRROR Error', msg=msg + '\n' + '\n'.join(f'{path}: {error}' for path, error in summary['errors'][:5]), geo=(400, 300))
+        else: PRMP_MsgBox(self, title='MIRROR Successful', msg=msg, yes=dict(compound='left', image=PRMP_Image('ok', b64=images['ok'], for_tk=1, resize=(24, 24)), text='Ok'), geo=(400, 300), delay=0)
+
     def action(self, act):
         if not self.path.verify(): ErrorBox(self, title='Path Error', msg='Invalid Path Error!')
 
@@ -759,6 +552,264 @@ class DeviceFileSystems(Gui):
         self.tree.viewObjs(device.filesystems)
 
 
+class Stat_Row:
+    def __init__(self, name, size=0, files=0, folders=0, subs=[]):
+        self.name = name
+        self.full_size = size
+        self.size = Base.format_size(self, size)
+        self.files = files
+        self.folders = folders or ''
+        self.subs = subs
+
+    def __str__(self): return self.name
+    def __repr__(self): return f'<Stat_Row({self.name}, size={self.size})>'
+
+
+class StorageStats_Window(Gui):
+
+    def __init__(self, master=None, geo=(700, 500), device=None, **kwargs):
+        super().__init__(master, title=f'{device.name} Storage Statistics', geo=geo, asb=0, resize=(0, 0), tw=1, tm=1, **kwargs)
+        self.device = device
+
+        self.setPRMPIcon('application', b64=images['application'])
+        self.setTkIcon(images['application'])
+
+        self.tree = Hierachy(self.cont, place=dict(relx=0, rely=0, relw=1, relh=.9), columns=[dict(text='Name', width=300), dict(text='Size'), dict(text='Files', width=10), dict(text='Folders', width=10)])
+
+        IconButton(self.cont, text='Rescan', place=dict(relx=.5, rely=.91, relh=.08, relw=.24), image='reload', compound='left', command=self.rescan, new=False, hl=1)
+        IconButton(self.cont, text='Export JSON', place=dict(relx=.75, rely=.91, relh=.08, relw=.24), image='file_s', compound='left', command=self.export, new=False, hl=1)
+
+        self.show()
+
+    # the first Storage_Stats is a pass over the whole tree, so it and the groups are built in a task.
+    def show(self): self.run_task(self.groups, done=self.tree.viewObjs, name='Statistics')
+
+    def groups(self):
+        stats = self.device.root_directory.storage_stats
+        rows = lambda values: [Stat_Row(*value) for value in values]
+
+        groups = [
+            Stat_Row('Media Types', *stats.total, subs=rows(stats.by_media_type())),
+            Stat_Row('Extensions', *stats.total, subs=rows(stats.by_extension())),
+            Stat_Row('Top Folders', *stats.total, subs=rows(stats.by_top_folder())),
+            Stat_Row('Largest Files', subs=[Stat_Row(f.path, f.full_size, 1) for f in stats.largest_files()]),
+            Stat_Row('Largest Folders', subs=[Stat_Row(str(f), *stats.folder_sizes.get(str(f).lower(), [0])) for f in stats.largest_folders()]),
+        ]
+        return groups
+
+    def rescan(self):
+        # listing and parsing run in the task; the swap into the tree open FolderViews may be showing happens here on the Tk thread.
+        self.run_task(self.device.root_directory.fetch, done=self.rescanned, progress=lambda stage, detail='': self.setTitle(f'{self.device.name} Rescan - {stage} {detail}'), cancelled=self.rescanned, error=self.rescanned, name='Rescan')
+
+    def rescanned(self, fresh):
+        self.setTitle(f'{self.device.name} Storage Statistics')
+        if isinstance(fresh, Root_Directory):
+            self.device.root_directory.swap(fresh)
+            self.show()
+        elif not isinstance(fresh, Task_Cancelled): ErrorBox(self, title='Rescan Error', msg=fresh)
+
+    def export(self):
+        path = filedialog.asksaveasfilename(parent=self, defaultextension='.json', filetypes=[('JSON', '*.json')], initialfile=f'{self.device.name}_treemap.json')
+        if path: self.run_task(lambda: self.device.root_directory.storage_stats.export_json(path), name='Export')
+
+
+class Change_Row:
+    def __init__(self, name, change='', old=0, new=0, subs=[]):
+        self.name = name
+        self.change = change
+        self.old = Base.format_size(self, old) if old else ''
+        self.new = Base.format_size(self, new) if new else ''
+        delta = new - old
+        self.delta = ('+' if delta >= 0 else '-') + Base.format_size(self, abs(delta))
+        self.subs = subs
+
+    def __str__(self): return self.name
+
+
+class SnapshotDiff_Window(Gui):
+    shown = 500
+
+    def __init__(self, master=None, geo=(800, 500), device=None, old=None, new=None, **kwargs):
+        super().__init__(master, title=f'{device.name} Changes', geo=geo, asb=0, resize=(0, 0), tw=1, tm=1, **kwargs)
+        self.device = device
+
+        self.setPRMPIcon('application', b64=images['application'])
+        self.setTkIcon(images['application'])
+
+        snapshots = device.get('snapshots') or []
+        self.old = old or (snapshots[-2] if len(snapshots) > 1 else None)
+        self.new = new or (snapshots[-1] if snapshots else None)
+        self.diff = None
+
+        self.tree = Hierachy(self.cont, place=dict(relx=0, rely=0, relw=1, relh=.9), columns=[dict(text='Name', width=350), dict(text='Change'), dict(text='Old'), dict(text='New'), dict(text='Delta')])
+
+        self.label = Label(self.cont, text=f'{self.old} -->> {self.new or "now"}', place=dict(relx=0, rely=.91, relh=.08, relw=.74))
+        IconButton(self.cont, text='Export CSV', place=dict(relx=.75, rely=.91, relh=.08, relw=.24), image='file_s', compound='left', command=self.export, new=False, hl=1)
+
+        self.show()
+
+    # snapshotting the live tree and the merge both walk every entry, so they run in a task.
+    def show(self): self.run_task(self.rows, done=self.tree.viewObjs, name='Changes')
+
+    def rows(self):
+        new = self.new or Snapshot(self.device.root_directory)
+        diff = Snapshot_Diff(self.old or new, new)
+        groups = {change: [] for change in diff.counts}
+
+        for change, path, old, new, kind in diff:
+            rows = groups[change]
+            if len(rows) < self.shown: rows.append(Change_Row(path, change, old, new))
+
+        counts = diff.counts
+        rows = [Change_Row(f'{change.title()} ({counts[change]})', subs=rows) for change, rows in groups.items()]
+        rows.append(Change_Row('Folders', subs=[Change_Row(path, 'rollup', max(-delta, 0), max(delta, 0)) for path, delta in diff.rollups(self.shown)]))
+        self.diff = diff
+        return rows
+
+    def export(self):
+        path = filedialog.asksaveasfilename(parent=self, defaultextension='.csv', filetypes=[('CSV', '*.csv')], initialfile=f'{self.device.name}_changes.csv')
+        if path and self.diff: self.run_task(self.diff.export, path, name='Export')
+
+
+class Logcat_Window(Gui):
+    rows_shown = 200
+    poll_delay = 250
+
+    def __init__(self, master=None, geo=(950, 550), device=None, **kwargs):
+        super().__init__(master, title=f'{device.name} Logcat', geo=geo, asb=0, resize=(0, 0), tw=1, tm=1, **kwargs)
+        self.device = device
+        self.logcat = Logcat(serial=device.unique)
+        self.priority = 0
+        self.start_index = 0
+        self.drawn = None
+
+        self.setPRMPIcon('application', b64=images['application'])
+        self.setTkIcon(images['application'])
+
+        Label(self.cont, text='Tag', place=dict(relx=0, rely=0, relh=.07, relw=.05))
+        self.tags = Entry(self.cont, place=dict(relx=.05, rely=.01, relh=.05, relw=.17))
+        Label(self.cont, text='PID', place=dict(relx=.22, rely=0, relh=.07, relw=.05))
+        self.pids = Entry(self.cont, place=dict(relx=.27, rely=.01, relh=.05, relw=.1))
+        Label(self.cont, text='Regex', place=dict(relx=.37, rely=0, relh=.07, relw=.07))
+        self.pattern = Entry(self.cont, place=dict(relx=.44, rely=.01, relh=.05, relw=.26))
+        self.priority_button = Button(self.cont, text='Level: V', place=dict(relx=.7, rely=0, relh=.07, relw=.12), command=self.nextPriority)
+        IconButton(self.cont, text='Filter', place=dict(relx=.82, rely=0, relh=.07, relw=.18), image='search', compound='left', command=self.applyFilter, new=False, hl=1)
+
+        self.tree = Hierachy(self.cont, place=dict(relx=0, rely=.07, relw=1, relh=.83), columns=[dict(text='Time', width=120), dict(text='PID', attr='pid', width=50), dict(text='TID', attr='tid', width=50), dict(text='P', attr='level', width=20), dict(text='Tag', width=120), dict(text='Message', width=500)])
+
+        self.status = Label(self.cont, text='', place=dict(relx=0, rely=.91, relh=.08, relw=.38))
+        Button(self.cont, text='<', place=dict(relx=.38, rely=.91, relh=.08, relw=.05), command=lambda: self.showRows(self.start_index - self.rows_shown))
+        Button(self.cont, text='>', place=dict(relx=.43, rely=.91, relh=.08, relw=.05), command=lambda: self.showRows(self.start_index + self.rows_shown))
+        self.follow = IconCheckbutton(self.cont, text='Follow', place=dict(relx=.48, rely=.91, relh=.08, relw=.12), image='show', compound='left', new=False)
+        self.follow.set(1)
+        self.start_button = IconButton(self.cont, text='Stop', place=dict(relx=.6, rely=.91, relh=.08, relw=.12), image='usb', compound='left', command=self.toggleLogcat, new=False, hl=1)
+        IconButton(self.cont, text='Clear', place=dict(relx=.72, rely=.91, relh=.08, relw=.12), image='reload', compound='left', command=self.clear, new=False, hl=1)
+        IconButton(self.cont, text='Export', place=dict(relx=.84, rely=.91, relh=.08, relw=.16), image='file_s', compound='left', command=self.export, new=False, hl=1)
+
+        self.toggleLogcat()
+        self.after(self.poll_delay, self.pollLogcat)
+
+    def destroy(self):
+        self.logcat.stop()
+        super().destroy()
+
+    def nextPriority(self):
+        self.priority = (self.priority + 1) % len(LOG_PRIORITIES)
+        self.priority_button.config(text=f'Level: {LOG_PRIORITIES[self.priority]}')
+
+    def applyFilter(self):
+        tags = self.tags.get().split()
+        pids = [pid for pid in self.pids.get().replace(',', ' ').split() if pid.isdigit()]
+
+        try: filter = Log_Filter(tags, self.priority, pids, self.pattern.get())
+        except re.error as error: return ErrorBox(self, title='Regex Error', msg=str(error))
+
+        # refiltering walks the whole ring, so it runs off the Tk thread.
+        self.run_task(self.logcat.buffer.set_filter, filter, done=lambda r: self.showRows(), name='Filter')
+
+    def showRows(self, index=None):
+        buffer = self.logcat.buffer
+        count = len(buffer)
+
+        if self.follow.get() and index is None: index = count - self.rows_shown
+        elif index is None: index = self.start_index
+        elif index + self.rows_shown < count: self.follow.set(0)
+
+        self.start_index = min(max(index, 0), max(count - self.rows_shown, 0))
+        self.drawn = buffer.total, self.start_index, buffer.filter
+
+        # only the rows on screen ever become tree items, however big the ring gets.
+        self.tree.viewObjs(buffer.rows(self.start_index, self.start_index + self.rows_shown))
+        self.status.config(text=f'{self.start_index+1}-{min(self.start_index+self.rows_shown, count)} of {count} | {self.logcat.rate:.0f} lines/s | dropped {buffer.dropped}')
+
+    def pollLogcat(self):
+        buffer = self.logcat.buffer
+        if self.drawn != (buffer.total, self.start_index, buffer.filter) and (self.follow.get() or not self.drawn): self.showRows()
+
+        self.start_button.config(text='Stop' if self.logcat.running else 'Start')
+        self.after(self.poll_delay, self.pollLogcat)
+
+    def toggleLogcat(self):
+        if self.logcat.running: self.logcat.stop()
+        # the first start probes exec-out on the device.
+        else: self.run_task(self.logcat.start, name='Logcat')
+
+    def clear(self):
+        self.logcat.buffer.clear()
+        self.showRows(0)
+
+    def export(self):
+        path = filedialog.asksaveasfilename(parent=self, defaultextension='.txt', filetypes=[('Text', '*.txt')], initialfile=f'{self.device.name}_logcat.txt')
+        if path: self.run_task(self.logcat.buffer.export, path, name='Export')
+
+
+class Packages_Window(Gui):
+
+    def __init__(self, master=None, geo=(900, 500), device=None, **kwargs):
+        super().__init__(master, title=f'{device.name} Packages', geo=geo, asb=0, resize=(0, 0), tw=1, tm=1, **kwargs)
+        self.device = device
+        self.inventory = Device_Packages.inventory(device.unique)
+
+        self.setPRMPIcon('application', b64=images['application'])
+        self.setTkIcon(images['application'])
+
+        self.tree = Hierachy(self.cont, place=dict(relx=0, rely=0, relw=1, relh=.9), columns=[dict(text='Package', width=280), dict(text='Version', attr='version', width=80), dict(text='Size', attr='size', width=60), dict(text='Updated', attr='updated', width=120), dict(text='Path', attr='path', width=300)])
+
+        self.status = Label(self.cont, text='', place=dict(relx=0, rely=.91, relh=.08, relw=.3))
+        self.fleet = IconCheckbutton(self.cont, text='All Devices', place=dict(relx=.3, rely=.91, relh=.08, relw=.14), image='usb', compound='left', new=False)
+        IconButton(self.cont, text='Refresh', place=dict(relx=.44, rely=.91, relh=.08, relw=.14), image='reload', compound='left', command=self.refresh, new=False, hl=1)
+        IconButton(self.cont, text='Install', place=dict(relx=.58, rely=.91, relh=.08, relw=.14), image='file_s', compound='left', command=self.install, new=False, hl=1)
+        IconButton(self.cont, text='Splits', place=dict(relx=.72, rely=.91, relh=.08, relw=.12), image='file_s', compound='left', command=lambda: self.install(1), new=False, hl=1)
+        IconButton(self.cont, text='Uninstall', place=dict(relx=.84, rely=.91, relh=.08, relw=.16), image='generic', compound='left', command=self.uninstall, new=False, hl=1)
+
+        # the saved inventory shows at once; only a device never listed before waits for the first refresh.
+        if self.inventory.refreshed: self.show()
+        else: self.refresh()
+
+    def show(self, results=[]):
+        self.tree.viewObjs(sorted(self.inventory, key=lambda package: package.name))
+        failed = [result for result in results if not result.ok]
+        self.status.config(text=f'{len(self.inventory)} packages' + (f' | {len(results)-len(failed)} ok, {len(failed)} failed' if results else ''))
+        if failed: ErrorBox(self, title='Packages Error', msg='\n'.join(f'{result.serial}: {result.target}: {result.output}' for result in failed[:10]))
+
+    def refresh(self): self.run_task(self.inventory.refresh, done=lambda r: self.show(), name='Packages')
+
+    # `every` is the checkbox, read on the Tk thread before the task; Fleet(None) lists the devices, so it is built in the task.
+    def makeFleet(self, every): return Fleet(None if every else [self.device.unique])
+
+    def install(self, splits=0):
+        apks = filedialog.askopenfilenames(parent=self, filetypes=[('APK', '*.apk')])
+        if not apks: return
+        every = self.fleet.get()
+        self.run_task(lambda: list(self.makeFleet(every).install([list(apks)] if splits else list(apks))), done=self.show, name='Install')
+
+    def uninstall(self):
+        package = self.tree.tree.selected()
+        if not package: return
+        every = self.fleet.get()
+        self.run_task(lambda: list(self.makeFleet(every).uninstall(package.name)), done=self.show, name='Uninstall')
+
+
 class DeviceProperty(PRMP_FillWidgets, LabelFrame):
 
     def __init__(self, master, device=None, **kwargs):
@@ -773,8 +824,10 @@ class DeviceProperty(PRMP_FillWidgets, LabelFrame):
         self.unique = LabelLabel(self, topKwargs=dict(text='Unique', relief='flat'), place=dict(relx=0, rely=.55, relh=.11, relw=1), orient='h', longent=.3, bottomKwargs=dict(anchor='e'))
         self.transport_id = LabelLabel(self, topKwargs=dict(text='Transport ID', relief='flat'), place=dict(relx=0, rely=.66, relh=.11, relw=1), orient='h', longent=.35, bottomKwargs=dict(anchor='e'))
 
-        IconButton(self, text='File Systems', place=dict(relx=0, rely=.78, relh=.1, relw=1), command=self.openFileS, image='file_s', compound='left', new=False, hl=1)
-        IconButton(self, text='Root Directories', place=dict(relx=0, rely=.89, relh=.1, relw=1), command=self.openRootD, image='root_d', compound='left', new=False, hl=1)
+        IconButton(self, text='File Systems', place=dict(relx=0, rely=.78, relh=.1, relw=.5), command=self.openFileS, image='file_s', compound='left', new=False, hl=1)
+        IconButton(self, text='Logcat', place=dict(relx=.5, rely=.78, relh=.1, relw=.5), command=self.openLogcat, image='generic', compound='left', new=False, hl=1)
+        IconButton(self, text='Root Directories', place=dict(relx=0, rely=.89, relh=.1, relw=.5), command=self.openRootD, image='root_d', compound='left', new=False, hl=1)
+        IconButton(self, text='Packages', place=dict(relx=.5, rely=.89, relh=.1, relw=.5), command=self.openPackages, image='generic', compound='left', new=False, hl=1)
 
         self.addResultsWidgets(['name', 'manufacturer', 'brand', 'model', 'product', 'unique', 'transport_id'])
         self.set(device)
@@ -782,8 +835,65 @@ class DeviceProperty(PRMP_FillWidgets, LabelFrame):
     def openFileS(self):
         if self.values and not self.values.dummy: DeviceFileSystems(self, device=self.values)
 
+    def openLogcat(self):
+        if self.values and not self.values.dummy: Logcat_Window(self, device=self.values)
+
+    def openPackages(self):
+        if self.values and not self.values.dummy: Packages_Window(self, device=self.values)
+
     def openRootD(self):
-        if self.values and not self.values.dummy: FolderViews_Window(self, device=self.values)
+        device = self.values
+        if device and not device.dummy: self.run_task(self.mappedTree, device, done=lambda tree: self.showTree(device, tree), name='Tree')
+
+    def mappedTree(self, device):
+        client = ADB_Client()
+        # a running server has the shared, freshest tree; it is kept in a file of its own, as the server may run in this folder and streams device.mapped_path.
+        if client.running(): return client.tree(device.unique, f'{device.unique}.served{MAPPED_EXT}')
+        return device.mapped_tree()
+
+    def showTree(self, device, tree):
+        if tree: FolderViews_Window(self, device=device, fds=tree.root, title=f'{device.name}-{device.unique} Folders (mapped)')
+        else: FolderViews_Window(self, device=device)
+
+
+class Screen_Panel(Frame):
+    poll_delay = 15
+    status_delay = .5
+
+    def __init__(self, master, stream=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.stream = stream
+        self.photo = None
+        self.status_shown = 0
+
+        self.screen = Label(self, relief='flat', place=dict(relx=0, rely=0, relw=1, relh=.92))
+        self.status = Label(self, text='', relief='flat', place=dict(relx=0, rely=.92, relw=1, relh=.08))
+
+        self.polling = self.after(self.poll_delay, self.pollScreen)
+
+    def destroy(self):
+        self.after_cancel(self.polling)
+        self.stream.stop()
+        super().destroy()
+
+    def pollScreen(self):
+        image = self.stream.latest()
+        if image:
+            # pasting into the same photo is cheaper than a new one per frame; only a rotation changes its size.
+            if self.photo and (self.photo.width(), self.photo.height()) == image.size: self.photo.paste(image)
+            else:
+                self.photo = PIL_ImageTk.PhotoImage(image)
+                self.screen.config(image=self.photo)
+
+        now = time.time()
+        if now - self.status_shown > self.status_delay:
+            self.status_shown = now
+            stats = self.stream.stats()
+            if self.stream.error: text = f'Stopped: {self.stream.error}'
+            else: text = f"{stats['notice'] + ' ' if stats['notice'] else ''}{stats['mode']} {stats['width']}x{stats['height']} | {stats['capture_fps']:.0f} fps captured, {stats['shown_fps']:.0f} shown | {stats['latency']*1000:.0f} ms after arrival | dropped {stats['dropped']}"
+            self.status.config(text=text)
+
+        self.polling = self.after(self.poll_delay, self.pollScreen)
 
 
 class DevicesView(Table):
@@ -815,11 +925,18 @@ class Android_FileSystem(Gui):
         self.frame = Frame(self.cont)
         self.toggle = IconCheckbutton(self.frame, text='Show Devices', place=dict(relx=0, rely=0, relh=1, relw=.17), command=self.toggleDevices, compound='left', new=False)
 
-        IconButton(self.frame, text='Search', place=dict(relx=.17, rely=0, relh=1, relw=.15), image='search', compound='left', command=self.pop_search, new=False, hl=1)
+        IconButton(self.frame, text='Search', place=dict(relx=.17, rely=0, relh=1, relw=.13), image='search', compound='left', command=self.pop_search, new=False, hl=1)
         
-        IconButton(self.frame, text='Reload', place=dict(relx=.32, rely=0, relh=1, relw=.15), image='reload', compound='left', new=False, hl=1)
+        IconButton(self.frame, text='Reload', place=dict(relx=.30, rely=0, relh=1, relw=.13), image='reload', compound='left', new=False, hl=1)
+
+        IconButton(self.frame, text='Storage', place=dict(relx=.43, rely=0, relh=1, relw=.13), image='file_s', compound='left', command=self.open_stats, new=False, hl=1)
+
+        IconButton(self.frame, text='Changes', place=dict(relx=.56, rely=0, relh=1, relw=.13), image='match', compound='left', command=self.open_changes, new=False, hl=1)
+
+        self.mirror = IconCheckbutton(self.frame, text='Mirror', place=dict(relx=.69, rely=0, relh=1, relw=.11), image='show', compound='left', command=self.toggleMirror, new=False)
+        self.screen = None
         
-        IconButton(self.frame, text='Check Connection', place=dict(relx=.76, rely=0, relh=1, relw=.22), image='usb', command=lambda: self.check_connection(0), compound='left', new=False, hl=1)
+        IconButton(self.frame, text='Check Connection', place=dict(relx=.80, rely=0, relh=1, relw=.18), image='usb', command=lambda: self.check_connection(0), compound='left', new=False, hl=1)
 
         self.devices = LabelFrame(self.cont, text='Devices')
 
@@ -829,7 +946,10 @@ class Android_FileSystem(Gui):
 
         self.refresh_cached()
 
-        threading.Thread(target=self.loadUp).start()
+        self.loadUp()
+
+        # scans and searches can take minutes; the periodic connection check is left running.
+        self.bind('<Escape>', lambda event: self.cancel_tasks('Scan', 'Search'))
 
         self.toggleDevices()
         self.start()
@@ -840,9 +960,6 @@ class Android_FileSystem(Gui):
 
     def search_path(self, res):
         device = self.details.values
-        files = []
-        folders = []
-
 
         path = res.get('path', '')
         case = res.get('case')
@@ -853,49 +970,109 @@ class Android_FileSystem(Gui):
         if not case: path = path.lower()
         
         root = device.root_directory
-        alls = dict(**root.all_folders, **root.all_files)
-        
-        
-        for ff, obj in alls.items():
-            comp_path = obj.path if case else ff
-            in_path = comp_path.split('/')[-1]
+        self.run_task(root.search, path, case, match, done=lambda fds: self.searched(fds, device, path), progress=self.showProgress, cancelled=self.idle, error=self.failed, name='Search')
 
-            if match: valid = path == in_path
-            else: valid = path in in_path
+    def searched(self, fds, device, path):
+        self.idle()
+        FolderViews_Window(self, device=device, fds=fds, title=f'Search results for {path}')
 
-            if valid:
-                lis = files if obj.file else folders
-                lis.append(obj)
+    def showProgress(self, stage, detail=''): self.setTitle(f'Android FileSystem - {stage} {detail} (Esc cancels)')
 
-        fds = folders, files
-        FolderViews_Window(self, device=device, fds=fds, title=f'Search results for {path}')
+    def idle(self, *args): self.setTitle('Android FileSystem')
+
+    def failed(self, error):
+        self.idle()
+        ErrorBox(self, title='An Error Occured.', msg=error, geo=(300, 250))
+
+    def open_stats(self):
+        device = self.details.values
+        if device and not device.dummy and device.root_directory: StorageStats_Window(self, device=device)
+        else: ErrorBox(self, title='Choose a device!', msg='Pick a cached device with a scanned root directory first.')
+
+    def open_changes(self):
+        device = self.details.values
+        if device and not device.dummy and device.root_directory: SnapshotDiff_Window(self, device=device)
+        else: ErrorBox(self, title='Choose a device!', msg='Pick a cached device with a scanned root directory first.')
+
+    def toggleMirror(self):
+        if self.screen:
+            self.screen.destroy()
+            self.screen = None
+        if not self.mirror.get(): return
+
+        device = self.details.values
+        if not device or device.dummy:
+            self.mirror.set(0)
+            return ErrorBox(self, title='Choose a device!', msg='Pick a connected device to mirror first.')
+
+        # the stream covers the android image, scaled down to fit it.
+        stream = Screen_Stream(device.unique, size=(392, 332))
+        self.run_task(stream.start, done=lambda r: self.mirrored(stream), error=lambda e: self.mirrorError(e, stream), name='Mirror', priority=INTERACTIVE)
+
+    def mirrored(self, stream):
+        if self.screen or not self.mirror.get(): return stream.stop()
+        self.screen = Screen_Panel(self.cont, stream=stream, place=dict(x=2, y=2, w=392, h=361))
+
+    def mirrorError(self, error, stream):
+        stream.stop()
+        self.mirror.set(0)
+        ErrorBox(self, title='Mirror Error', msg=error)
 
     def loadUp(self):
         self.check_connection()
         
     def refresh_cached(self, p=0):
         self.cached_devices.viewObjs(Devices.list())
-        if p: save()
+        if p: self.run_task(self.saveCache, name='Save')
+
+    def saveCache(self):
+        # a running server owns the db; two processes rewriting it would each drop the other's changes.
+        client = ADB_Client()
+        if client.running(): client.save()
+        else: save()
     
     def check_connection(self, quiet=1):
-            try:
-                connecteds = Devices.create_devices(1)
-                self.connected_devices.viewObjs(connecteds)
-                conn = connecteds[0]
-                if not self.details.values:
-                    device = Devices.devices.get(conn.unique, conn)
-                    self.details.set(device)
-
-                if (len(connecteds) == 1) and quiet == 0:
-                    Devices.add_device(conn)
-                    self.refresh_cached(1)
-
-            except ADB_Error as e:
-                self.connected_devices.tree.clear()
-                if not quiet: ErrorBox(self, title='An Error Occured.', msg=e, geo=(300, 250))
-            except ValueError: ...
-            
-            if quiet: self.after(1000, self.check_connection)
+        self.run_task(self.connectedDevices, done=lambda connecteds: self.connected(connecteds, quiet), error=lambda e: self.connection_error(e, quiet), name='Connection', priority=INTERACTIVE)
+
+    def connected(self, connecteds, quiet=1):
+        self.connected_devices.viewObjs(connecteds)
+        conn = connecteds[0]
+        if not self.details.values:
+            device = Devices.devices.get(conn.unique, conn)
+            self.details.set(device)
+
+        if (len(connecteds) == 1) and quiet == 0:
+            self.setTitle(f'Android FileSystem - scanning {conn.name}')
+            self.run_task(self.scanDevice, conn, done=self.scanned, progress=self.showProgress, cancelled=self.idle, error=self.failed, name='Scan')
+
+        if quiet: self.after(1000, self.check_connection)
+
+    # while a server runs it owns adb, so devices are listed and scanned through it.
+    def connectedDevices(self):
+        client = ADB_Client()
+        if not client.running(): return Devices.create_devices(1)
+        return [info_device(info) for info in client.devices(connected=1)]
+
+    def scanDevice(self, conn):
+        client = ADB_Client()
+        if not client.running(): return Devices.add_device(conn)
+
+        # the scanned tree comes back through the db the server saves, so it has to run in this folder; scanned() has the server save again rather than writing the db here.
+        client.scan(conn.unique)
+        client.save()
+        load()
+
+    def scanned(self, result=None):
+        self.idle()
+        self.refresh_cached(1)
+
+    def connection_error(self, e, quiet=1):
+        if isinstance(e, ADB_Error):
+            self.connected_devices.tree.clear()
+            if not quiet: ErrorBox(self, title='An Error Occured.', msg=e, geo=(300, 250))
+        elif not isinstance(e, ValueError) and not quiet: ErrorBox(self, title='An Error Occured.', msg=e, geo=(300, 250))
+
+        if quiet: self.after(1000, self.check_connection)
     
     def toggleDevices(self):
         x, y = self.geo
@@ -913,9 +1090,18 @@ class Android_FileSystem(Gui):
             self.placeOnScreen(side=self.side, geometry=(x, y))
             self.devices.place_forget()
 
-    def save(self): subprocess.check_output('wmic process where name="adb.exe" delete')
+    def save(self):
+        # the server owns adb while it runs.
+        if not ADB_Client().running(): subprocess.check_output('wmic process where name="adb.exe" delete')
 
 
 # save()
-if __name__ == '__main__': Android_FileSystem()
+def main():
+    # not at import time: the parse process pool re-imports the script that started it in every worker on Windows.
+    check_assets()
+    load()
+    Android_FileSystem()
+
+
+if __name__ == '__main__': main()
 
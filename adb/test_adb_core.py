@@ -0,0 +1,364 @@
+import io, pickle, queue, struct, subprocess, threading
+
+from adb_core import *
+
+
+LISTING = '''/sdcard:
+total 20
+4.0K DCIM/
+4.0K Music/
+1.0M a.mp3
+
+/sdcard/DCIM:
+total 8
+4.0K Camera/
+2.0M x.jpg
+
+/sdcard/DCIM/Camera:
+total 8
+3.0M y.jpg
+2.0M z.mp4
+
+/sdcard/Music:
+total 4
+1.0M b.mp3
+'''
+
+RESCANNED = '''/sdcard:
+total 20
+4.0K DCIM/
+4.0K Music/
+2.0M a.mp3
+
+/sdcard/DCIM:
+total 8
+2.0M x.jpg
+
+/sdcard/Music:
+total 4
+1.0M b.mp3
+1.0M c.ogg
+'''
+
+
+class Listed_Root(Root_Directory):
+    # loads from `listing` instead of a device.
+    listing = LISTING
+
+    def load(self, path):
+        if path not in self.load_paths: self.load_paths.append(path)
+        self.parse(self.listing)
+
+
+def empty_root():
+    root = Listed_Root.__new__(Listed_Root)
+    Folder.__init__(root, None, Root_Directory.path)
+    root.device = None
+    root.all_folders, root.all_files = {}, {}
+    root.load_paths, root.stats = [], None
+    return root
+
+
+def make_root(listing=LISTING):
+    root = empty_root()
+    root.listing = listing
+    root.load('/sdcard')
+    return root
+
+
+def stats_state(stats):
+    state = stats.summary()
+    state['folder_sizes'] = {key: value for key, value in stats.folder_sizes.items()}
+    return state
+
+
+def test_storage_stats_update_matches_fresh_scan():
+    root = make_root()
+    stats = root.storage_stats
+    assert stats.summary()['folders'] == 4
+
+    Listed_Root.listing = RESCANNED
+    try: root.rescan()
+    finally: Listed_Root.listing = LISTING
+
+    assert '/sdcard/dcim/camera' not in stats.folder_sizes
+    assert stats_state(stats) == stats_state(Storage_Stats(root))
+
+
+def test_bulk_pull_takes_mapped_selections(tmp_path):
+    root = make_root()
+    path = str(tmp_path / 'device.tree')
+    Mapped_Tree.write(root, path)
+    tree = Mapped_Tree(path)
+
+    try:
+        file = tree.find('/sdcard/DCIM/x.jpg')
+        pull = Bulk_Pull(file, tmp_path)
+        assert pull.paths == ['/sdcard/DCIM/x.jpg']
+        assert pull.base == '/sdcard/DCIM'
+        assert pull.counts() == (1, file.full_size)
+
+        folder = tree.find('/sdcard/DCIM')
+        pull = Bulk_Pull(folder, tmp_path)
+        assert pull.paths == ['/sdcard/DCIM']
+        assert pull.base == '/sdcard'
+        assert pull.counts() == (3, root.find_folder('/sdcard/DCIM').full_size)
+    finally: tree.close()
+
+
+def test_task_cancel_stops_at_next_step():
+    events, started = queue.Queue(), threading.Event()
+
+    def work():
+        started.set()
+        while True: Task.step('working')
+
+    task = Task(work, events=events)
+    thread = threading.Thread(target=task.run, daemon=True)
+    thread.start()
+    started.wait(5)
+    task.cancel()
+    thread.join(5)
+
+    kinds = [event for _, event, _ in Task_Scheduler.drain(events)]
+    assert kinds[-1] == 'cancelled'
+    assert 'error' not in kinds
+
+
+def test_watcher_overflow_swaps_on_apply():
+    root = make_root()
+    watcher = Tree_Watcher(root, apply=False)
+
+    Listed_Root.listing = RESCANNED
+    try: fresh = root.fetch()
+    finally: Listed_Root.listing = LISTING
+
+    watcher.pending.put(('rescan', fresh))
+    # nothing changes until the owner applies it.
+    assert '/sdcard/dcim/camera' in root.all_folders
+
+    assert watcher.apply_pending() is None
+    assert '/sdcard/dcim/camera' not in root.all_folders
+    assert root.find_folder('/sdcard').parent is root
+    assert '-H' in watcher.poll_script()
+
+
+class Listed_Packages(Package_Inventory):
+    # answers like Android 8: no --show-versioncode, so the listing has paths only.
+    def __init__(self, serial, paths):
+        super().__init__(serial)
+        self.paths, self.scripts = paths, []
+
+    def run(self, script):
+        self.scripts.append(script)
+        if script == 'pm list packages -f': return ''.join(f'package:{path}={name}\n' for name, path in self.paths.items())
+        if script.startswith('for p in'): return ''.join(f'package:{name}\nversionCode=7 minSdk=21\n' for name in self.paths)
+        return ''
+
+
+def test_package_refresh_without_listed_codes():
+    inventory = Listed_Packages('emulator-5554', {'a.b': '/data/app/a.b-1/base.apk', 'c.d': '/data/app/c.d-1/base.apk'})
+    assert inventory.refresh()['changed'] == 2
+    assert inventory.get('a.b').version_code == 7
+
+    inventory.paths['c.d'] = '/data/app/c.d-2/base.apk'
+    assert inventory.refresh()['changed'] == 1
+    assert inventory.get('a.b').version_code == 7
+
+
+def test_raw_frames_read_back_to_back():
+    # a rotation between frames swaps the dimensions; each header gives its own size.
+    frames = [struct.pack('<IIII', 2, 3, 1, 0) + b'\1' * 24, struct.pack('<IIII', 3, 2, 3, 0) + b'\2' * 18]
+    stream = Screen_Stream('emulator-5554', 'raw')
+    stream.header, stream.running = 16, True
+
+    class Process: stdout = io.BytesIO(b''.join(frames))
+    stream.read_raw(Process)
+
+    assert stream.error is None
+    assert stream.captured.take(0)[0] == frames[1]
+    assert stream.captured.dropped == 1
+
+
+def test_parallel_parse_matches_serial():
+    # a headerless start, files without a size, and enough folders that 12 chunks cut it at many headers.
+    data = '1.0K loose.txt\n\n' + ''.join(f'/sdcard/d{i}:\ntotal 8\n4.0K sub/\n{i}.0K f{i}.jpg\nnosize\n\n/sdcard/d{i}/sub:\n2.0M g{i}.mp4\n\n' for i in range(40))
+    assert len(split_listing(data, 12)) > 4
+
+    serial, parallel = empty_root(), empty_root()
+    serial.parse(data)
+    parallel.parse_parallel(data, 3)
+
+    assert len(serial.all_files) == 121
+    assert serial.same_tree(parallel)
+    assert parallel.find_folder('/sdcard/d7/sub').files['/sdcard/d7/sub/g7.mp4'].size == '2.00 M'
+
+
+def test_db_loads_gui_pickles_without_the_gui(tmp_path, monkeypatch):
+    # the GUI's db names the classes prmp_adb.*; same length as adb_core, so the pickle stays valid.
+    monkeypatch.chdir(tmp_path)
+    device = Device('emulator-5554 device product:p model:m device:pixel transport_id:1', dummy=True)
+    (tmp_path / DEFAULT_DB).write_bytes(pickle.dumps({'emulator-5554': device}, 4).replace(b'adb_core', b'prmp_adb'))
+
+    try:
+        assert isinstance(load()['emulator-5554'], Device)
+        save()
+        Devices.devices.clear()
+        assert load()['emulator-5554'].name == 'pixel'
+    finally: Devices.devices.clear()
+
+
+class Listed_Transport:
+    # stands in for ExecOut with canned find output.
+    def __init__(self, data, error=b''): self.data_error = data, error
+
+    def exec(self, args, quiet=0): return self
+
+
+def mirror_plan(tmp_path, monkeypatch, data, error=b''):
+    for rel in ['DCIM/a.jpg', 'DCIM/old.jpg', 'Android/data/app/cache.bin', 'Gone/b.txt']:
+        path = tmp_path.joinpath(*rel.split('/'))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'0123456789')
+
+    monkeypatch.setattr(ExecOut, 'transport', classmethod(lambda cls: Listed_Transport(data, error)))
+    return Mirror('/sdcard', str(tmp_path), prune=True).plan()
+
+
+def test_mirror_prunes_only_listed_folders(tmp_path, monkeypatch):
+    data = b'41f9 4096 0 /sdcard\n41f9 4096 0 /sdcard/DCIM\n41f9 4096 0 /sdcard/Android\n41f9 4096 0 /sdcard/Android/data\n81b0 10 100 /sdcard/DCIM/a.jpg\n'
+    plan = mirror_plan(tmp_path, monkeypatch, data, b"find: '/sdcard/Android/data': Permission denied\n")
+
+    assert sorted(entry[0] for entry in plan.prune) == ['DCIM/old.jpg', 'Gone/b.txt']
+    assert not plan.unpruned
+
+
+def test_mirror_never_prunes_on_an_empty_listing(tmp_path, monkeypatch):
+    plan = mirror_plan(tmp_path, monkeypatch, b'', b'find: /sdcard: No such file or directory\n')
+    assert plan.prune == []
+    assert plan.unpruned
+
+
+def test_snapshot_diff_merges_with_real_paths():
+    old, new = Snapshot(make_root()), Snapshot(make_root(RESCANNED))
+    diff = Snapshot_Diff(old, new)
+    M = 1024 ** 2
+
+    assert sorted(diff) == [
+        ('added', '/sdcard/Music/c.ogg', 0, M, 1),
+        ('removed', '/sdcard/DCIM/Camera', 0, 0, 0),
+        ('removed', '/sdcard/DCIM/Camera/y.jpg', 3 * M, 0, 1),
+        ('removed', '/sdcard/DCIM/Camera/z.mp4', 2 * M, 0, 1),
+        ('resized', '/sdcard/a.mp3', M, 2 * M, 1),
+    ]
+    assert diff.counts == {'added': 1, 'removed': 3, 'resized': 1}
+    assert dict(diff.rollups())['/sdcard/DCIM'] == -5 * M
+    assert dict(diff.rollups())['/sdcard'] == -3 * M
+
+
+def test_size_view_follows_descendant_changes():
+    root = make_root()
+    sdcard = root.find_folder('/sdcard')
+    names = lambda: [obj.basename for obj in sdcard.view('size', True).folder_s]
+
+    assert names() == ['DCIM', 'Music']
+    assert isinstance(sdcard.folder_s, tuple)
+
+    root.sync_folder('/sdcard/Music', [('b.mp3', '1.0M', False), ('big.bin', '10M', False)])
+    assert names() == ['Music', 'DCIM']
+    assert sdcard.full_size == 19 * 1024 ** 2
+
+
+def test_log_buffer_evicts_and_filters():
+    ring = Ring_Buffer(3)
+    for item in range(5): ring.append(item)
+    assert list(ring) == [2, 3, 4] and ring[-1] == 4
+    assert ring.popleft() == 2 and list(ring) == [3, 4]
+
+    # odd records are tagged 'app', pids alternate 100/101, priorities cycle V..F.
+    records = lambda start, stop: [Log_Record('', 100 + i % 2, 1, i % 6, 'app' if i % 2 else 'other', f'line {i}') for i in range(start, stop)]
+    messages = lambda buffer: [record.message for record in buffer.rows(0, len(buffer))]
+
+    buffer = Log_Buffer(4, Log_Filter(['app']))
+    buffer.extend(records(0, 10))
+    assert buffer.dropped == 6
+    assert messages(buffer) == ['line 7', 'line 9']
+
+    buffer.set_filter(Log_Filter(pids=['100']))
+    assert messages(buffer) == ['line 6', 'line 8']
+    buffer.set_filter(Log_Filter(pattern='line [78]'))
+    assert messages(buffer) == ['line 7', 'line 8']
+
+    # matches older than the ring go with their records.
+    buffer.set_filter(Log_Filter(priority=2))
+    assert messages(buffer) == ['line 8', 'line 9']
+    buffer.extend(records(10, 14))
+    assert messages(buffer) == ['line 10', 'line 11']
+
+
+def test_logcat_parse_binary_keeps_partial_entry():
+    def entry(tag, message, priority, header=0):
+        payload = bytes([priority]) + tag + b'\0' + message + b'\0'
+        return struct.pack('<HHiIII', len(payload), header, 42, 43, 0, 5000000) + b'\0' * (header and header - 20) + payload
+
+    # a v1 entry (header size 0 means 20 bytes), a v3 one with a 24-byte header, then half of a third.
+    third = entry(b'Tag', b'third', 7, 24)
+    data = entry(b'ActivityManager', b'Start proc', 4) + entry(b'dalvikvm', b'GC', 3, 24) + third[:30]
+
+    logcat = Logcat(binary=True)
+    records, rest = logcat.parse_binary(data)
+    assert [(r.pid, r.tid, LOG_PRIORITIES[r.priority], r.tag, r.message) for r in records] == [(42, 43, 'I', 'ActivityManager', 'Start proc'), (42, 43, 'D', 'dalvikvm', 'GC')]
+    assert records[0].time.endswith('.005')
+    assert rest == third[:30]
+
+    records, rest = logcat.parse_binary(rest + third[30:])
+    assert [(r.priority, r.tag, r.message) for r in records] == [(5, 'Tag', 'third')] and rest == b''
+
+
+def test_scheduler_serves_by_class_then_round_robin():
+    # one slot in all, so the waiters run strictly one after another.
+    scheduler = Command_Scheduler()
+    scheduler.device_slots = scheduler.host_slots = 1
+    scheduler.class_slots, scheduler.reserve = [1, 1, 1], [0, 0, 0]
+    order = []
+
+    def wait(serial, priority):
+        ticket = scheduler.acquire(serial, priority)
+        order.append((PRIORITIES[priority], serial))
+        scheduler.release(ticket)
+
+    held = scheduler.acquire('a', NORMAL)
+    threads = []
+    for serial, priority in [('a', BULK), ('a', NORMAL), ('b', NORMAL), ('b', INTERACTIVE)]:
+        threads.append(threading.Thread(target=wait, args=(serial, priority), daemon=True))
+        threads[-1].start()
+        # queued in this order, so the result can't come from thread start-up timing.
+        while True:
+            with scheduler.condition:
+                if sum(map(len, itertools.chain(*scheduler.waiting.values()))) == len(threads): break
+
+    scheduler.release(held)
+    for thread in threads: thread.join(5)
+
+    # the interactive command served 'b' more recently than the held slot served 'a', so among the normal ones 'a' goes first.
+    assert order == [('interactive', 'b'), ('normal', 'a'), ('normal', 'b'), ('bulk', 'a')]
+    assert scheduler.total == 0
+
+
+def test_exec_out_sends_the_command_as_one_argument(monkeypatch):
+    # adb escapes every exec-out/exec-in argument after the first, so anything split would reach the device quoted.
+    calls = []
+    monkeypatch.setattr(subprocess, 'Popen', lambda args, **kwargs: calls.append(args))
+
+    with Command_Context('emulator-5554'):
+        ExecOut._exec(['cat', shlex.quote('/sdcard/a b.jpg'), '2>/dev/null'])
+        ExecIn._exec('tar -xf - -C /sdcard')
+        Shell._exec(['ls', '/sdcard'])
+    ExecOut._exec(['screencap'])
+
+    assert calls == [
+        [ADB_EXE, '-s', 'emulator-5554', 'exec-out', "cat '/sdcard/a b.jpg' 2>/dev/null"],
+        [ADB_EXE, '-s', 'emulator-5554', 'exec-in', 'tar -xf - -C /sdcard'],
+        [ADB_EXE, '-s', 'emulator-5554', 'shell', 'ls', '/sdcard'],
+        [ADB_EXE, 'exec-out', 'screencap'],
+    ]